@@ -2,35 +2,70 @@
 # -*- coding: utf-8 -*-
 """
 ТУРБО ПАРАЛЛЕЛЬНЫЙ ПАРСЕР для www.goszakup.gov.kz
-ВСЕ браузеры работают ОДНОВРЕМЕННО в HEADLESS режиме
+Страницы загружаются ОДНОВРЕМЕННО по HTTP, браузеры - резерв для страниц с JS
 """
 
+import argparse
+import base64
+import json
 import random
+import re
+import copy
 import time
+from collections import deque
+from functools import lru_cache
 from datetime import datetime, timedelta
-from typing import List, Dict, Set
+from typing import Callable, List, Dict, Set, Optional, Tuple
 import sqlite3
-from bs4 import BeautifulSoup
+from lxml import etree, html as lxml_html
 import os
+import pathlib
 import sys
 import threading
 import tempfile
+import socket
+import subprocess
 import logging
+import multiprocessing
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+import io
+import queue
 import signal
 import atexit
 import psutil
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import zstandard as zstd
+import asyncio
+import aiohttp
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
 
 # Selenium imports
 from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.chrome.remote_connection import ChromeRemoteConnection
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException, WebDriverException
 from webdriver_manager.chrome import ChromeDriverManager
 
+class ZstdRotatingFileHandler(RotatingFileHandler):
+    """Ротируемый лог, сжимаемый zstd на лету, с 64 КБ буфером без сброса после каждой записи"""
+    
+    def _open(self):
+        self._raw = open(self.baseFilename, 'ab')
+        writer = zstd.ZstdCompressor(level=1).stream_writer(self._raw)
+        return io.TextIOWrapper(io.BufferedWriter(writer, buffer_size=1 << 16), encoding=self.encoding)
+    
+    def shouldRollover(self, record):
+        # Сжатый поток не поддерживает seek, размер берем по файлу на диске
+        if self.stream is None:
+            self.stream = self._open()
+        return self.maxBytes > 0 and self._raw.tell() >= self.maxBytes
+    
+    def flush(self):
+        # Буфер сбрасывается при заполнении, ротации и закрытии хендлера
+        pass
+
 # Настройка детального логирования в файл
 def setup_detailed_logging():
     """Настройка детального логирования в файл"""
@@ -47,29 +82,373 @@ def setup_detailed_logging():
     # Очищаем предыдущие хендлеры
     file_logger.handlers.clear()
     
+    # Дочерние процессы пишут в свои файлы, ротация одного файла из нескольких процессов небезопасна
+    # Номер берем из имени процесса (SpawnProcess-<N>), а не PID, чтобы ротация ограничивала число файлов
+    log_file = 'turbo_parser_detailed.log.zst'
+    process_name = multiprocessing.current_process().name
+    if process_name != 'MainProcess':
+        log_file = f'turbo_parser_detailed_{process_name.rsplit("-", 1)[-1]}.log.zst'
+    
     # Файловый хендлер с подробным форматом
-    file_handler = logging.FileHandler('turbo_parser_detailed.log', encoding='utf-8', mode='w')
+    file_handler = ZstdRotatingFileHandler(
+        log_file,
+        encoding='utf-8',
+        maxBytes=64 * 1024 * 1024,
+        backupCount=10
+    )
     file_formatter = logging.Formatter(
         '%(asctime)s | %(levelname)-8s | %(funcName)-20s | %(message)s',
         datefmt='%Y-%m-%d %H:%M:%S'
     )
     file_handler.setFormatter(file_formatter)
-    file_logger.addHandler(file_handler)
     
-    return file_logger
+    # Потоки парсера только кладут записи в очередь, в файл пишет фоновый поток
+    log_queue = queue.Queue(-1)
+    file_logger.addHandler(QueueHandler(log_queue))
+    listener = QueueListener(log_queue, file_handler, respect_handler_level=True)
+    listener.start()
+    
+    return file_logger, listener
+
+def stop_detailed_logging():
+    """Остановка фоновой записи логов, дальше логгер пишет в файл напрямую"""
+    queue_handlers = [h for h in detailed_logger.handlers if isinstance(h, QueueHandler)]
+    if not queue_handlers:
+        return
+    
+    log_listener.stop()
+    for handler in queue_handlers:
+        detailed_logger.removeHandler(handler)
+    for handler in log_listener.handlers:
+        detailed_logger.addHandler(handler)
 
 # Инициализируем логгер
-detailed_logger = setup_detailed_logging()
+detailed_logger, log_listener = setup_detailed_logging()
+atexit.register(stop_detailed_logging)
+
+# Скомпилированные XPath для таблицы реестра поставщиков
+_TABLE_XP = etree.XPath('//table[@id="search-result"]')
+_ROW_XP = etree.XPath('//table[@id="search-result"]//tr[td]')
+_CELLS_XP = etree.XPath('./td')
+_LINK_XP = etree.XPath('(./td[2]//a)[1]/@href')
+_SUPPLIER_ID_RE = re.compile(r'/show_supplier/([^/?#]+)')
+_ROW_FIELDS = ('participant_number', 'name', 'bin', 'iin', 'rnn')
+
+# Основная таблица карточки поставщика
+_DETAILS_TABLE_XP = etree.XPath('//table[@class="table table-striped"]')
+_DETAILS_ROW_XP = etree.XPath('.//tr')
+_DETAILS_CELLS_XP = etree.XPath('.//th | .//td')
+
+# Повторы HTTP запросов при сетевых сбоях и ошибках сервера
+HTTP_RETRIES = 3
+HTTP_BACKOFF = 0.3
+
+# Адаптивные паузы: доля ошибок по последним запросам определяет паузу перед страницей
+PACING_WINDOW = 500
+PACING_MIN_SAMPLES = 50
+PACING_BASE_DELAY = 5
+PACING_MAX_DELAY = 60
+
+# JS для получения из браузера только нужной таблицы вместо всего page_source
+_LIST_TABLE_JS = "var e=document.getElementById('search-result');return e?e.outerHTML:'';"
+_DETAILS_TABLE_JS = "var e=document.querySelector('table.table.table-striped');return e?e.outerHTML:'';"
+
+# Локаторы ожидания нужных таблиц в резервном браузере
+_LIST_TABLE_LOCATOR = (By.ID, "search-result")
+_DETAILS_TABLE_LOCATOR = (By.CSS_SELECTOR, "table.table.table-striped")
+
+# User-Agent для HTTP клиента и браузеров
+USER_AGENTS = [
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+]
+
+def _free_port() -> int:
+    """Свободный локальный TCP порт"""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def _dns_resolver() -> aiohttp.abc.AbstractResolver:
+    """Асинхронный резолвер aiodns, а если он недоступен в этом цикле событий - стандартный"""
+    try:
+        return aiohttp.AsyncResolver()
+    except RuntimeError as e:
+        # Старые aiodns на Windows требуют SelectorEventLoop, а asyncio.run создает Proactor
+        detailed_logger.warning(f"aiodns недоступен ({e}), DNS резолвится в пуле потоков")
+        return aiohttp.ThreadedResolver()
+
+def _cdp(driver, cmd: str, params: dict) -> dict:
+    """Вызов Chrome DevTools Protocol через удаленный chromedriver"""
+    return driver.execute('executeCdpCommand', {'cmd': cmd, 'params': params})['value']
+
+def _document_body(driver) -> str:
+    """Тело ответа основного документа из CDP, пустая строка если его нет в журнале"""
+    request_id = None
+    
+    # Журнал performance опустошается при каждом чтении, берем последний ответ-документ
+    # get_log есть только у ChromiumDriver, у webdriver.Remote вызываем команду напрямую, как в _cdp
+    for entry in driver.execute('getLog', {'type': 'performance'})['value']:
+        if '"Network.responseReceived"' not in entry['message']:
+            continue
+        message = json.loads(entry['message'])['message']
+        if message['params'].get('type') == 'Document':
+            request_id = message['params']['requestId']
+    
+    if request_id is None:
+        return ''
+    
+    try:
+        response = _cdp(driver, 'Network.getResponseBody', {'requestId': request_id})
+    except WebDriverException:
+        return ''
+    
+    body = response.get('body', '')
+    if response.get('base64Encoded'):
+        body = base64.b64decode(body).decode('utf-8', 'replace')
+    return body
+
+@lru_cache(maxsize=None)
+def _build_options(headless: bool) -> Options:
+    """Базовые настройки Chrome, одинаковые для всех браузеров пула"""
+    options = Options()
+    
+    # browser.get() возвращается по DOMContentLoaded, не дожидаясь загрузки ресурсов
+    options.page_load_strategy = 'eager'
+    
+    # HEADLESS режим для снижения нагрузки
+    if headless:
+        options.add_argument("--headless=new")  # Новый headless режим
+    
+    # GPU и песочница не нужны, /dev/shm в контейнерах мал для десятков браузеров
+    options.add_argument("--disable-gpu")
+    options.add_argument("--no-sandbox")
+    options.add_argument("--disable-dev-shm-usage")
+    
+    # ПОЛНОЕ ПОДАВЛЕНИЕ ВСЕХ ЛОГОВ
+    options.add_argument("--disable-logging")
+    options.add_argument("--disable-gpu-logging")
+    options.add_argument("--disable-extensions")
+    options.add_argument("--disable-plugins")
+    options.add_argument("--disable-images")
+    options.add_argument("--blink-settings=imagesEnabled=false")  # Картинки не декодируются и не грузятся
+    options.add_argument("--silent")
+    options.add_argument("--log-level=3")  # Минимальный уровень логов
+    options.add_argument("--disable-web-security")
+    options.add_argument("--disable-features=VizDisplayCompositor")
+    options.add_argument("--disable-blink-features=AutomationControlled")
+    
+    # УБИРАЕМ DevTools и WARNING сообщения
+    options.add_argument("--remote-debugging-port=0")  # Отключаем remote debugging
+    options.add_argument("--disable-dev-tools")
+    options.add_argument("--disable-gpu-sandbox")
+    options.add_argument("--disable-software-rasterizer")
+    options.add_argument("--disable-background-timer-throttling")
+    options.add_argument("--disable-backgrounding-occluded-windows")
+    options.add_argument("--disable-renderer-backgrounding")
+    options.add_argument("--disable-background-networking")
+    options.add_argument("--disable-ipc-flooding-protection")
+    
+    # Журнал сетевых событий CDP: из него берется requestId ответа-документа
+    options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
+    options.add_experimental_option('perfLoggingPrefs', {'enableNetwork': True, 'enablePage': False})
+    
+    # Убираем DevTools сообщения
+    options.add_experimental_option("excludeSwitches", ["enable-logging", "enable-automation"])
+    options.add_experimental_option('useAutomationExtension', False)
+    
+    # Убираем все уведомления и картинки
+    prefs = {
+        "profile.managed_default_content_settings.images": 2,
+        "profile.default_content_setting_values": {
+            "notifications": 2,
+            "media_stream_mic": 2,
+            "media_stream_camera": 2,
+            "geolocation": 2
+        }
+    }
+    options.add_experimental_option("prefs", prefs)
+    
+    return options
+
+# Ресурсы, которые браузеру не нужно загружать (парсим только HTML)
+BLOCKED_URL_PATTERNS = [
+    '*.png', '*.jpg', '*.jpeg', '*.gif', '*.svg', '*.ico',
+    '*.woff', '*.woff2', '*.ttf', '*.css',
+    '*.webp', '*analytics*', '*gtag*', '*yandex*', '*doubleclick*'
+]
+
+# Размеры окон браузеров
+WINDOW_SIZES = ["1920,1080", "1366,768", "1440,900", "1600,900", "1280,720"]
+
+# Настройки SQLite: WAL, один fsync на чекпоинт, кэш и mmap в памяти
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-65536",
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA busy_timeout=5000",
+)
+
+# datetime пишется в БД одним зарегистрированным адаптером, в формате CURRENT_TIMESTAMP
+sqlite3.register_adapter(datetime, lambda d: d.isoformat(sep=' '))
+
+# SQL для записи поставщиков (дубликаты отсекает UNIQUE в БД)
+_SQL_INSERT_SUPPLIER = '''
+    INSERT OR IGNORE INTO suppliers 
+    (participant_number, name, bin, iin, rnn, supplier_id, detail_url, is_parsed, updated_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+_SQL_MARK_PARSED = 'UPDATE suppliers SET is_parsed = 1, updated_at = ? WHERE supplier_id = ?'
+_SQL_DELETE_DETAILS = 'DELETE FROM supplier_details WHERE supplier_id = ?'
+_SQL_INSERT_DETAIL = '''
+    INSERT OR REPLACE INTO supplier_details (supplier_id, section, field_name, field_value)
+    VALUES (?, ?, ?, ?)
+'''
+_SQL_LOG_FAIL = '''
+    INSERT INTO failed_attempts (page_number, supplier_id, error_message)
+    VALUES (?, ?, ?)
+'''
+
+# Схема БД (общая для основной БД и шардов)
+SCHEMA_SQL = (
+    '''
+    CREATE TABLE IF NOT EXISTS suppliers (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        participant_number TEXT UNIQUE,
+        name TEXT,
+        bin TEXT,
+        iin TEXT,
+        rnn TEXT,
+        supplier_id TEXT UNIQUE,
+        detail_url TEXT,
+        is_parsed BOOLEAN DEFAULT FALSE,
+        is_failed BOOLEAN DEFAULT FALSE,
+        retry_count INTEGER DEFAULT 0,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS supplier_details (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        supplier_id TEXT,
+        section TEXT,
+        field_name TEXT,
+        field_value TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        UNIQUE(supplier_id, section, field_name)
+    )
+    ''',
+    # Таблица неудачных попыток
+    '''
+    CREATE TABLE IF NOT EXISTS failed_attempts (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        page_number INTEGER,
+        supplier_id TEXT,
+        error_message TEXT,
+        attempt_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        resolved BOOLEAN DEFAULT FALSE
+    )
+    ''',
+)
+
+# Колонки таблиц без id для переноса данных из шардов
+TABLE_COLUMNS = {
+    'suppliers': 'participant_number, name, bin, iin, rnn, supplier_id, detail_url, '
+                 'is_parsed, is_failed, retry_count, created_at, updated_at',
+    'supplier_details': 'supplier_id, section, field_name, field_value, created_at',
+    'failed_attempts': 'page_number, supplier_id, error_message, attempt_time, resolved',
+}
+
+# Как переносить строки шарда: поставщики, как и при обычной записи, не перезаписываются,
+# иначе сброшены были бы is_parsed и created_at; попытки дописываются как есть
+MERGE_VERBS = {
+    'suppliers': "INSERT OR IGNORE",
+    'failed_attempts': "INSERT",
+}
+
+# Поставщик, чью карточку разобрал дочерний процесс, отмечается разобранным и в основной БД
+_SQL_MERGE_PARSED = '''
+    UPDATE main.suppliers
+    SET is_parsed = 1,
+        updated_at = (SELECT s.updated_at FROM shard.suppliers s WHERE s.supplier_id = main.suppliers.supplier_id)
+    WHERE NOT is_parsed
+      AND supplier_id IN (SELECT supplier_id FROM shard.suppliers WHERE is_parsed)
+'''
+
+# Максимум шардов (по одному на процесс, см. run_multiprocess)
+DB_SHARDS = 8
+
+# Сколько страниц копить в памяти перед записью в БД одной транзакцией
+SAVE_EVERY_PAGES = 20
+
+def create_tables(conn: sqlite3.Connection):
+    """Создание таблиц, если их еще нет"""
+    for statement in SCHEMA_SQL:
+        conn.execute(statement)
+
+def shard_file(db_file: str, index: int) -> str:
+    """Имя файла шарда БД"""
+    base, ext = os.path.splitext(db_file)
+    return f"{base}_{index}{ext}"
+
+def find_shard_files(db_file: str) -> List[str]:
+    """Существующие файлы шардов основной БД"""
+    return [shard_file(db_file, i) for i in range(DB_SHARDS) if os.path.exists(shard_file(db_file, i))]
+
+def merge_shards(db_file: str) -> int:
+    """Перенос данных из шардов в основную БД, возвращает число обработанных шардов"""
+    shards = find_shard_files(db_file)
+    if not shards:
+        return 0
+    
+    conn = sqlite3.connect(db_file, isolation_level=None)
+    create_tables(conn)
+    
+    for path in shards:
+        conn.execute("ATTACH DATABASE ? AS shard", (path,))
+        try:
+            conn.execute("BEGIN")
+            for table, columns in TABLE_COLUMNS.items():
+                verb = MERGE_VERBS.get(table, "INSERT OR REPLACE")
+                conn.execute(f"{verb} INTO main.{table} ({columns}) SELECT {columns} FROM shard.{table}")
+            # Уже известных поставщиков не перезаписываем, переносим только отметку о разобранной карточке
+            conn.execute(_SQL_MERGE_PARSED)
+            conn.execute("COMMIT")
+        except Exception:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.execute("DETACH DATABASE shard")
+        
+        # Перенесенный шард удаляем, чтобы повторное объединение не задвоило данные
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+        detailed_logger.info(f"Шард {path} перенесен в {db_file}")
+    
+    conn.close()
+    return len(shards)
 
 class TurboParallelParser:
-    def __init__(self, total_browsers: int = 50, headless: bool = True):
+    def __init__(self, total_browsers: int = 50, headless: bool = True, fallback_js: bool = False,
+                 fetch_details: bool = True, db_file: str = 'turbo_goszakup.db',
+                 show_stats: bool = True, known_db: Optional[str] = None):
         self.base_url = "https://www.goszakup.gov.kz"
         self.total_browsers = total_browsers
         self.headless = headless
-        self.db_file = 'turbo_goszakup.db'
+        self.fallback_js = fallback_js  # Браузеры только для страниц, которым нужен JS
+        self.fetch_details = fetch_details  # Догружать карточки новых поставщиков
+        self.db_file = db_file
+        self.known_db = known_db  # Основная БД дочернего процесса, только для чтения разобранных поставщиков
+        self.show_stats = show_stats  # Консольная статистика, выключается в дочерних процессах
         self.total_pages = 10000
         self.records_per_page = 50
-        self.break_time = 5  # Уменьшил передышку для headless
         
         # Статистика
         self.start_time = datetime.now()
@@ -78,27 +457,57 @@ class TurboParallelParser:
         self.detailed_suppliers = 0
         self.stats_lock = threading.Lock()
         
-        # Для проверки дубликатов и утраченных записей
-        self.processed_suppliers = set()
+        # Для учета дубликатов и утраченных записей
         self.duplicates_found = 0
         self.failed_pages: Set[int] = set()
         self.failed_suppliers: Set[str] = set()
         
-        # Пул браузеров и процессов
+        # Исходы последних HTTP запросов (1 - ошибка) для адаптивных пауз
+        self.recent_errors = deque(maxlen=PACING_WINDOW)
+        
+        # Асинхронный HTTP клиент для серверных HTML страниц (создается в цикле событий)
+        self.client: Optional[aiohttp.ClientSession] = None
+        self.pages_sem: Optional[asyncio.Semaphore] = None
+        
+        # Резервный пул браузеров и процессов
         self.browser_pool = []
+        self.browser_queue = queue.Queue()
+        self.browser_executor: Optional[ThreadPoolExecutor] = None  # Поток на браузер, живет весь запуск
+        self._browser_tls = threading.local()
         self.browser_processes = []
+        self._our_processes: Set[psutil.Process] = set()  # psutil сверяет время создания, PID не спутать с чужим
         self.temp_dirs = []
         self.is_shutting_down = False
         
         detailed_logger.info("=== ИНИЦИАЛИЗАЦИЯ ТУРБО ПАРСЕРА ===")
-        detailed_logger.info(f"Общее количество браузеров: {total_browsers}")
+        detailed_logger.info(f"Параллельных загрузок: {total_browsers}")
+        detailed_logger.info(f"Резервные браузеры для JS: {fallback_js}")
+        detailed_logger.info(f"Загрузка деталей поставщиков: {fetch_details}")
         detailed_logger.info(f"Headless режим: {headless}")
         
         # Регистрируем обработчики для корректного завершения
         self.setup_cleanup_handlers()
         
+        # Соединения с БД: по одному на поток, открываются один раз
+        self._tls = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        
+        # Буфер строк (поставщик, детали) до записи пачкой
+        self._pending_rows: List[tuple] = []
+        self._pending_pages = 0
+        self._pending_lock = threading.RLock()  # RLock: буфер дописывается и из обработчика сигнала
+        
+        # Поставщики в загрузке или в буфере: в БД их еще нет, повторно карточку не грузим
+        self._claimed_ids: Set[str] = set()
+        
+        # Один поток для запросов к БД, чтобы транзакции не останавливали цикл событий
+        self.db_executor: Optional[ThreadPoolExecutor] = None
+        
         self.init_database()
-        self.setup_chrome_driver()
+        
+        if self.fallback_js:
+            self.setup_chrome_driver()
         
     def setup_cleanup_handlers(self):
         """Настройка обработчиков для корректного завершения"""
@@ -136,15 +545,25 @@ class TurboParallelParser:
         # Удаляем временные директории
         self.cleanup_temp_dirs()
         
+        # Дописываем буфер строк, пока соединения с БД еще открыты
+        self.flush_pending_rows()
+        if self._pending_rows:
+            supplier_ids = [supplier.get('supplier_id') for supplier, _ in self._pending_rows]
+            detailed_logger.error(f"Не сохранены поставщики ({len(supplier_ids)}): {supplier_ids}")
+        
+        # Закрываем соединение с БД
+        self.close_database()
+        
         print("✅ Очистка завершена")
         detailed_logger.info("Очистка ресурсов завершена")
+        
+        # Дописываем очередь логов в файл
+        stop_detailed_logging()
     
     def close_all_browsers(self):
-        """Закрытие всех браузеров"""
-        if not self.browser_pool:
-            return
-        
-        print(f"🔒 Закрытие {len(self.browser_pool)} браузеров...")
+        """Закрытие всех браузеров и их chromedriver процессов"""
+        if self.browser_pool:
+            print(f"🔒 Закрытие {len(self.browser_pool)} браузеров...")
         
         for i, browser in enumerate(self.browser_pool):
             try:
@@ -154,31 +573,55 @@ class TurboParallelParser:
                 detailed_logger.warning(f"Ошибка закрытия браузера {i+1}: {e}")
         
         self.browser_pool.clear()
+        
+        if self.browser_executor:
+            self.browser_executor.shutdown(wait=False, cancel_futures=True)
+            self.browser_executor = None
+        
+        for process in self.browser_processes:
+            if process.poll() is None:
+                process.terminate()
+        
+        self.browser_processes.clear()
     
     def kill_chrome_processes(self):
-        """Принудительное завершение всех Chrome процессов"""
+        """Принудительное завершение наших chromedriver и Chrome процессов"""
+        if not self._our_processes:
+            return
+        
         print("🔨 Завершение Chrome процессов...")
         killed_count = 0
         
-        try:
-            for proc in psutil.process_iter(['pid', 'name', 'cmdline']):
-                try:
-                    if proc.info['name'] and 'chrome' in proc.info['name'].lower():
-                        # Проверяем, что это наш процесс (содержит user-data-dir)
-                        cmdline = proc.info['cmdline'] or []
-                        if any('user-data-dir' in str(arg) for arg in cmdline):
-                            proc.kill()
-                            killed_count += 1
-                            detailed_logger.debug(f"Убит Chrome процесс: PID {proc.info['pid']}")
-                except (psutil.NoSuchProcess, psutil.AccessDenied):
-                    continue
-        except Exception as e:
-            detailed_logger.error(f"Ошибка завершения Chrome процессов: {e}")
+        # Завершаем только запомненные процессы, не перебирая все процессы системы;
+        # если PID уже занят другим процессом, psutil выбросит NoSuchProcess
+        for proc in list(self._our_processes):
+            try:
+                proc.kill()
+                killed_count += 1
+                detailed_logger.debug(f"Убит Chrome процесс: PID {proc.pid}")
+            except psutil.NoSuchProcess:
+                continue
+            except psutil.AccessDenied as e:
+                detailed_logger.warning(f"Не удалось завершить PID {proc.pid}: {e}")
+        
+        self._our_processes.clear()
         
         if killed_count > 0:
             print(f"⚰️  Завершено {killed_count} Chrome процессов")
             time.sleep(2)  # Даем время процессам завершиться
     
+    def remember_browser_pids(self):
+        """Запоминание chromedriver процессов и запущенных ими Chrome"""
+        for process in self.browser_processes:
+            try:
+                driver_proc = psutil.Process(process.pid)
+                self._our_processes.add(driver_proc)
+                self._our_processes.update(driver_proc.children(recursive=True))
+            except psutil.NoSuchProcess:
+                continue
+        
+        detailed_logger.debug(f"Отслеживается процессов браузеров: {len(self._our_processes)}")
+    
     def cleanup_temp_dirs(self):
         """Очистка временных директорий"""
         if not self.temp_dirs:
@@ -197,6 +640,20 @@ class TurboParallelParser:
         
         self.temp_dirs.clear()
 
+    def close_database(self):
+        """Закрытие всех соединений с БД"""
+        with self._connections_lock:
+            connections = list(self._connections)
+            self._connections.clear()
+        
+        for conn in connections:
+            try:
+                conn.close()
+            except Exception as e:
+                detailed_logger.warning(f"Ошибка закрытия БД: {e}")
+        
+        detailed_logger.debug(f"Закрыто соединений с БД: {len(connections)}")
+
     def setup_chrome_driver(self):
         """Настройка Chrome драйвера"""
         try:
@@ -219,168 +676,112 @@ class TurboParallelParser:
         """Очистка консоли"""
         os.system('cls' if os.name == 'nt' else 'clear')
     
+    def _connect(self, db_file: str = None, **kwargs) -> sqlite3.Connection:
+        """Открытие соединения с БД с примененными PRAGMA"""
+        conn = sqlite3.connect(db_file or self.db_file, **kwargs)
+        for pragma in SQLITE_PRAGMAS:
+            conn.execute(pragma)
+        return conn
+    
+    def _conn(self) -> sqlite3.Connection:
+        """Соединение с БД текущего потока (создается при первом обращении)"""
+        conn = getattr(self._tls, 'conn', None)
+        if conn is None:
+            conn = self._connect(check_same_thread=False, isolation_level=None, uri=True)
+            
+            # Дочерний процесс пишет в свой шард, а уже разобранных поставщиков смотрит в основной БД
+            if self.known_db:
+                conn.execute("ATTACH DATABASE ? AS known", (pathlib.Path(self.known_db).resolve().as_uri() + '?mode=ro',))
+            
+            self._tls.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+    
     def init_database(self):
         """Инициализация БД"""
-        conn = sqlite3.connect(self.db_file)
-        cursor = conn.cursor()
+        create_tables(self._conn())
         
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS suppliers (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                participant_number TEXT UNIQUE,
-                name TEXT,
-                bin TEXT,
-                iin TEXT,
-                rnn TEXT,
-                supplier_id TEXT UNIQUE,
-                detail_url TEXT,
-                is_parsed BOOLEAN DEFAULT FALSE,
-                is_failed BOOLEAN DEFAULT FALSE,
-                retry_count INTEGER DEFAULT 0,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS supplier_details (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                supplier_id TEXT,
-                section TEXT,
-                field_name TEXT,
-                field_value TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                UNIQUE(supplier_id, section, field_name)
-            )
-        ''')
-        
-        # Таблица неудачных попыток
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS failed_attempts (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                page_number INTEGER,
-                supplier_id TEXT,
-                error_message TEXT,
-                attempt_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                resolved BOOLEAN DEFAULT FALSE
-            )
-        ''')
+        detailed_logger.info("База данных инициализирована")
         
-        conn.commit()
-        conn.close()
+    def start_chromedrivers(self, count: int) -> List[int]:
+        """Одновременный запуск chromedriver процессов, возвращает порты готовых
         
-        detailed_logger.info("База данных инициализирована")
+        Вывод драйверов уходит в DEVNULL на уровне ОС, sys.stderr процесса не трогаем.
+        """
+        ports = []
+        for _ in range(count):
+            port = _free_port()
+            try:
+                process = subprocess.Popen(
+                    [self.chrome_driver_path, f"--port={port}", "--silent"],
+                    stdin=subprocess.DEVNULL,
+                    stdout=subprocess.DEVNULL,
+                    stderr=subprocess.DEVNULL,
+                    creationflags=getattr(subprocess, 'CREATE_NO_WINDOW', 0)  # Без консольных окон на Windows
+                )
+            except OSError as e:
+                detailed_logger.error(f"Ошибка запуска chromedriver: {e}")
+                continue
+            self.browser_processes.append(process)
+            try:
+                self._our_processes.add(psutil.Process(process.pid))
+            except psutil.NoSuchProcess:
+                pass
+            ports.append(port)
+        
+        # Ждем, пока все драйверы начнут принимать соединения
+        ready_ports = []
+        deadline = time.time() + 30
+        for port in ports:
+            while time.time() < deadline:
+                try:
+                    socket.create_connection(('127.0.0.1', port), timeout=0.5).close()
+                    ready_ports.append(port)
+                    break
+                except OSError:
+                    time.sleep(0.1)
+            else:
+                detailed_logger.error(f"chromedriver на порту {port} не запустился")
         
-    def create_stealth_browser(self, browser_id: int):
-        """Создание максимально скрытного браузера"""
+        detailed_logger.info(f"Запущено chromedriver: {len(ready_ports)}/{count}")
+        return ready_ports
+    
+    def create_stealth_browser(self, browser_id: int, port: int):
+        """Создание максимально скрытного браузера через chromedriver на порту port"""
         
         profile_dir = tempfile.mkdtemp(prefix=f"chrome_profile_{browser_id}_")
         self.temp_dirs.append(profile_dir)  # Для очистки
         
-        options = Options()
-        
-        # HEADLESS режим для снижения нагрузки
-        if self.headless:
-            options.add_argument("--headless=new")  # Новый headless режим
-            options.add_argument("--disable-gpu")
-            options.add_argument("--no-sandbox")
-            options.add_argument("--disable-dev-shm-usage")
-        
-        # ПОЛНОЕ ПОДАВЛЕНИЕ ВСЕХ ЛОГОВ
-        options.add_argument("--disable-logging")
-        options.add_argument("--disable-gpu-logging")
-        options.add_argument("--disable-extensions")
-        options.add_argument("--disable-plugins")
-        options.add_argument("--disable-images")
-        options.add_argument("--silent")
-        options.add_argument("--log-level=3")  # Минимальный уровень логов
-        options.add_argument("--disable-web-security")
-        options.add_argument("--disable-features=VizDisplayCompositor")
-        options.add_argument("--disable-blink-features=AutomationControlled")
-        
-        # УБИРАЕМ DevTools и WARNING сообщения
-        options.add_argument("--remote-debugging-port=0")  # Отключаем remote debugging
-        options.add_argument("--disable-dev-tools")
-        options.add_argument("--disable-gpu-sandbox")
-        options.add_argument("--disable-software-rasterizer")
-        options.add_argument("--disable-background-timer-throttling")
-        options.add_argument("--disable-backgrounding-occluded-windows")
-        options.add_argument("--disable-renderer-backgrounding")
-        options.add_argument("--disable-background-networking")
-        options.add_argument("--disable-ipc-flooding-protection")
-        
-        # Оптимизация для headless
-        if self.headless:
-            options.add_argument("--disable-background-timer-throttling")
-            options.add_argument("--disable-backgrounding-occluded-windows")
-            options.add_argument("--disable-renderer-backgrounding")
-            options.add_argument("--disable-background-networking")
-            options.add_argument("--disable-ipc-flooding-protection")
-        
-        # Убираем DevTools сообщения
-        options.add_experimental_option("excludeSwitches", ["enable-logging", "enable-automation"])
-        options.add_experimental_option('useAutomationExtension', False)
-        
-        # Убираем все уведомления
-        prefs = {
-            "profile.default_content_setting_values": {
-                "notifications": 2,
-                "media_stream_mic": 2,
-                "media_stream_camera": 2,
-                "geolocation": 2
-            }
-        }
-        options.add_experimental_option("prefs", prefs)
+        # Общие настройки собираются один раз, для браузера меняются только профиль, окно и UA
+        options = copy.deepcopy(_build_options(self.headless))
         
         options.add_argument(f"--user-data-dir={profile_dir}")
         
         # Размеры окон (для headless не критично, но оставим)
-        window_sizes = ["1920,1080", "1366,768", "1440,900", "1600,900", "1280,720"]
-        size = window_sizes[browser_id % len(window_sizes)]
+        size = WINDOW_SIZES[browser_id % len(WINDOW_SIZES)]
         options.add_argument(f"--window-size={size}")
         
         # User-Agent
-        user_agents = [
-            "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-            "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36",
-            "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-            "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
-        ]
-        user_agent = user_agents[browser_id % len(user_agents)]
+        user_agent = USER_AGENTS[browser_id % len(USER_AGENTS)]
         options.add_argument(f"--user-agent={user_agent}")
         
         try:
-            # Подавляем ВСЕ ЛОГИ service
-            service = Service(self.chrome_driver_path, log_path=os.devnull)
-            
-            # Перенаправляем stderr чтобы убрать WARNING сообщения
-            original_stderr = sys.stderr
-            sys.stderr = open(os.devnull, 'w')
-            
-            driver = webdriver.Chrome(service=service, options=options)
-            
-            # Возвращаем stderr
-            sys.stderr.close()
-            sys.stderr = original_stderr
+            # Подключаемся к уже запущенному chromedriver, Chrome стартует в нем
+            executor = ChromeRemoteConnection(remote_server_addr=f"http://127.0.0.1:{port}")
+            driver = webdriver.Remote(command_executor=executor, options=options)
             
             # Убираем признаки автоматизации
             driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
             
-            # Сохраняем процесс для мониторинга
-            self.browser_processes.append(driver.service.process)
+            # Блокируем картинки, стили, шрифты и аналитику на уровне сети
+            _cdp(driver, 'Network.enable', {})
+            _cdp(driver, 'Network.setBlockedURLs', {'urls': BLOCKED_URL_PATTERNS})
             
             detailed_logger.debug(f"Браузер {browser_id} создан успешно ({'headless' if self.headless else 'с интерфейсом'})")
             return driver
             
         except Exception as e:
-            # Возвращаем stderr если была ошибка
-            if 'original_stderr' in locals():
-                try:
-                    sys.stderr.close()
-                except:
-                    pass
-                sys.stderr = original_stderr
-            
             detailed_logger.error(f"Ошибка создания браузера {browser_id}: {e}")
             return None
     
@@ -389,176 +790,256 @@ class TurboParallelParser:
         mode_text = "HEADLESS браузеров" if self.headless else "браузеров с интерфейсом"
         print(f"🚀 ПАРАЛЛЕЛЬНОЕ создание {self.total_browsers} {mode_text}...")
         
-        # Создаем браузеры группами параллельно
-        batch_size = 50  # По 50 браузеров одновременно
-        total_batches = (self.total_browsers + batch_size - 1) // batch_size
+        # Все chromedriver запускаются разом отдельными процессами
+        ports = self.start_chromedrivers(self.total_browsers)
+        if not ports or self.is_shutting_down:
+            return
         
-        for batch_num in range(total_batches):
-            if self.is_shutting_down:
-                break
-            
-            start_idx = batch_num * batch_size
-            end_idx = min(start_idx + batch_size, self.total_browsers)
-            current_batch_size = end_idx - start_idx
-            
-            print(f"📦 ПАЧКА {batch_num + 1}/{total_batches}: Создание браузеров {start_idx + 1}-{end_idx}...")
+        # Сессии открываются параллельно, каждая ждет только свой драйвер
+        with ThreadPoolExecutor(max_workers=len(ports)) as executor:
+            future_to_id = {
+                executor.submit(self.create_stealth_browser, i, port): i
+                for i, port in enumerate(ports)
+            }
             
-            # Параллельное создание текущей пачки
-            with ThreadPoolExecutor(max_workers=current_batch_size) as executor:
-                future_to_id = {}
-                
-                for i in range(start_idx, end_idx):
-                    future = executor.submit(self.create_stealth_browser, i)
-                    future_to_id[future] = i
-                
-                # Собираем результаты
-                batch_success = 0
-                for future in as_completed(future_to_id):
-                    browser_id = future_to_id[future]
-                    try:
-                        browser = future.result()
-                        if browser:
-                            self.browser_pool.append(browser)
-                            batch_success += 1
-                            print(f"✅ Браузер {browser_id + 1} создан")
-                        else:
-                            print(f"❌ Браузер {browser_id + 1} НЕ создан")
-                    except Exception as e:
-                        print(f"💥 Ошибка создания браузера {browser_id + 1}: {e}")
-            
-            print(f"🎯 Пачка {batch_num + 1} завершена: {batch_success}/{current_batch_size} браузеров")
-            
-            # Небольшая пауза между пачками
-            if batch_num < total_batches - 1:
-                print("⏳ Пауза 2 секунды между пачками...")
-                time.sleep(2)
+            # Собираем результаты
+            for future in as_completed(future_to_id):
+                browser_id = future_to_id[future]
+                try:
+                    browser = future.result()
+                    if browser:
+                        self.browser_pool.append(browser)
+                        print(f"✅ Браузер {browser_id + 1} создан")
+                    else:
+                        print(f"❌ Браузер {browser_id + 1} НЕ создан")
+                except Exception as e:
+                    print(f"💥 Ошибка создания браузера {browser_id + 1}: {e}")
+        
+        for browser in self.browser_pool:
+            self.browser_queue.put(browser)
+        
+        # Каждый поток при старте один раз забирает свой браузер и держит его до конца запуска
+        if self.browser_pool:
+            self.browser_executor = ThreadPoolExecutor(
+                max_workers=len(self.browser_pool),
+                thread_name_prefix="browser",
+                initializer=self.bind_browser
+            )
+        
+        # Chrome уже запущены - фиксируем дерево процессов для очистки
+        self.remember_browser_pids()
         
         print(f"🏁 ГОТОВО! Создано {len(self.browser_pool)}/{self.total_browsers} браузеров")
         detailed_logger.info(f"Создан пул из {len(self.browser_pool)} браузеров")
     
-    def process_single_page(self, browser, page: int) -> List[Dict]:
-        """Обработка одной страницы одним браузером"""
+    async def fetch_page_html(self, url: str) -> str:
+        """Загрузка HTML страницы по HTTP с повторами"""
+        for attempt in range(HTTP_RETRIES + 1):
+            retry_after = 0
+            try:
+                async with self.pages_sem:
+                    async with self.client.get(url) as response:
+                        response.raise_for_status()
+                        html = await response.text()
+                self.recent_errors.append(0)
+                return html
+            except (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError, asyncio.TimeoutError) as e:
+                error = e
+            except aiohttp.ClientResponseError as e:
+                # Ошибки клиента (4xx) повторять бессмысленно, кроме 429 - это троттлинг
+                if e.status < 500 and e.status != 429:
+                    raise
+                error = e
+                
+                # 429 и 503 могут указать паузу в секундах в Retry-After
+                value = (e.headers or {}).get('Retry-After', '')
+                if value.isdigit():
+                    retry_after = min(int(value), PACING_MAX_DELAY)
+            
+            # Сетевые сбои, 5xx и 429 - признак перегрузки сервера
+            self.recent_errors.append(1)
+            
+            if attempt < HTTP_RETRIES:
+                # Пауза вне семафора, чтобы не занимать слот загрузки
+                await asyncio.sleep(max(retry_after, HTTP_BACKOFF * (2 ** attempt)))
+        
+        raise error
+    
+    def bind_browser(self):
+        """Закрепление браузера из пула за текущим потоком"""
+        self._browser_tls.driver = self.browser_queue.get()
+    
+    def fetch_with_browser(self, url: str, locator: tuple, fragment_js: str, parse: Callable):
+        """Загрузка страницы браузером текущего потока и разбор результата функцией parse"""
+        browser = self._browser_tls.driver
+        browser.get(url)
+        
+        # Если нужная таблица пришла в ответе браузеру, берем его тело по CDP без сериализации DOM
+        body = _document_body(browser)
+        result = parse(body) if body else None
+        if result:
+            return result
+        
+        # Таблицу строит JS - ждем ее в DOM и забираем только нужный фрагмент
+        wait = WebDriverWait(browser, 15)
+        wait.until(EC.presence_of_element_located(locator))
+        return parse(browser.execute_script(fragment_js))
+    
+    def parse_supplier_rows(self, html: str) -> Optional[List[Dict]]:
+        """Разбор таблицы реестра, None если таблицы нет в HTML"""
+        doc = lxml_html.fromstring(html)
+        if not _TABLE_XP(doc):
+            return None
+        
+        suppliers = []
+        
+        for row in _ROW_XP(doc):
+            cells = _CELLS_XP(row)
+            if len(cells) < 5:
+                continue
+            
+            # Текст ячеек собираем напрямую из текстовых узлов
+            supplier = dict(zip(_ROW_FIELDS, ["".join(cell.itertext()).strip() for cell in cells[:5]]))
+            
+            # Извлекаем ID из ссылки
+            hrefs = _LINK_XP(row)
+            match = _SUPPLIER_ID_RE.search(hrefs[0]) if hrefs else None
+            if match:
+                supplier['supplier_id'] = match.group(1)
+                supplier['detail_url'] = hrefs[0]
+                suppliers.append(supplier)
+        
+        return suppliers
+    
+    def parse_supplier_details(self, html: str) -> Dict:
+        """Разбор основной таблицы страницы поставщика"""
+        doc = lxml_html.fromstring(html)
+        
+        details = {}
+        
+        # Основная таблица
+        tables = _DETAILS_TABLE_XP(doc)
+        if tables:
+            for row in _DETAILS_ROW_XP(tables[0]):
+                cells = _DETAILS_CELLS_XP(row)
+                if len(cells) == 2:
+                    key = "".join(cells[0].itertext()).strip()
+                    value = "".join(cells[1].itertext()).strip()
+                    details[key] = value
+        
+        return details
+    
+    async def process_single_page(self, page: int) -> Tuple[List[Dict], int]:
+        """Обработка одной страницы реестра, возвращает (поставщики, дубликаты на странице)"""
         try:
             url = f"{self.base_url}/ru/registry/supplierreg?count_record={self.records_per_page}&page={page}"
+            loop = asyncio.get_running_loop()
+            
+            detailed_logger.debug("Загрузка страницы %d", page)
+            html = await self.fetch_page_html(url)
+            
+            # Разбор HTML в пуле потоков, чтобы не блокировать цикл событий
+            suppliers = await loop.run_in_executor(None, self.parse_supplier_rows, html)
+            
+            # Таблицы нет в HTML ответе - страница требует JS, грузим браузером
+            if suppliers is None and self.browser_pool:
+                detailed_logger.debug("Страница %d без таблицы в HTML, загрузка браузером", page)
+                suppliers = await loop.run_in_executor(self.browser_executor, self.fetch_with_browser,
+                                                       url, _LIST_TABLE_LOCATOR, _LIST_TABLE_JS, self.parse_supplier_rows)
+            
+            # Ответ без таблицы (блокировка, капча) - это неудача, а не пустая страница
+            if suppliers is None:
+                raise ValueError("таблица реестра не найдена в ответе")
             
-            detailed_logger.debug(f"Браузер обрабатывает страницу {page}")
-            browser.get(url)
-            
-            # Ждем загрузки таблицы
-            wait = WebDriverWait(browser, 15)
-            table = wait.until(EC.presence_of_element_located((By.ID, "search-result")))
-            
-            # Получаем HTML и парсим
-            html = browser.page_source
-            soup = BeautifulSoup(html, 'lxml')
-            
-            suppliers = []
-            table = soup.find('table', {'id': 'search-result'})
-            
-            if table:
-                tbody = table.find('tbody')
-                if tbody:
-                    for row in tbody.find_all('tr'):
-                        cells = row.find_all('td')
-                        if len(cells) >= 5:
-                            supplier = {
-                                'participant_number': cells[0].get_text(strip=True),
-                                'name': cells[1].get_text(strip=True),
-                                'bin': cells[2].get_text(strip=True),
-                                'iin': cells[3].get_text(strip=True),
-                                'rnn': cells[4].get_text(strip=True)
-                            }
-                            
-                            # Извлекаем ID из ссылки
-                            link = cells[1].find('a')
-                            if link and '/show_supplier/' in link.get('href', ''):
-                                supplier['supplier_id'] = link.get('href').split('/show_supplier/')[-1]
-                                supplier['detail_url'] = link.get('href')
-                                
-                                # Проверяем на дубликаты
-                                if supplier['supplier_id'] not in self.processed_suppliers:
-                                    self.processed_suppliers.add(supplier['supplier_id'])
-                                    suppliers.append(supplier)
-                                    detailed_logger.debug(f"Найден поставщик: {supplier['supplier_id']} - {supplier['name']}")
-                                else:
-                                    with self.stats_lock:
-                                        self.duplicates_found += 1
-                                    detailed_logger.debug(f"Дубликат пропущен: {supplier['supplier_id']}")
-            
-            detailed_logger.info(f"Страница {page}: найдено {len(suppliers)} уникальных поставщиков")
-            return suppliers
+            # Дубликаты внутри страницы считаем локально, без блокировок; остается первая запись
+            unique = {}
+            for supplier in suppliers:
+                unique.setdefault(supplier['supplier_id'], supplier)
+            dup_count = len(suppliers) - len(unique)
+            
+            detailed_logger.info("Страница %d: %d поставщиков, %d дубликатов", page, len(unique), dup_count)
+            return list(unique.values()), dup_count
             
         except Exception as e:
             detailed_logger.error(f"Ошибка парсинга страницы {page}: {e}")
             with self.stats_lock:
                 self.failed_pages.add(page)
-            self.log_failed_attempt(page, None, str(e))
-            return []
+            await asyncio.get_running_loop().run_in_executor(self.db_executor, self.log_failed_attempt, page, None, str(e))
+            return [], 0
     
-    def get_supplier_details(self, browser, supplier_id: str) -> Dict:
+    async def get_supplier_details(self, supplier_id: str) -> Dict:
         """Получение деталей поставщика"""
         try:
             url = f"{self.base_url}/ru/registry/show_supplier/{supplier_id}"
+            loop = asyncio.get_running_loop()
             
-            detailed_logger.debug(f"Получение деталей поставщика {supplier_id}")
-            browser.get(url)
-            
-            wait = WebDriverWait(browser, 15)
-            wait.until(EC.presence_of_element_located((By.CLASS_NAME, "table")))
-            
-            html = browser.page_source
-            soup = BeautifulSoup(html, 'lxml')
-            
-            details = {}
+            detailed_logger.debug("Получение деталей поставщика %s", supplier_id)
+            html = await self.fetch_page_html(url)
+            details = await loop.run_in_executor(None, self.parse_supplier_details, html)
             
-            # Основная таблица
-            main_table = soup.find('table', class_='table table-striped')
-            if main_table:
-                for row in main_table.find_all('tr'):
-                    cells = row.find_all(['th', 'td'])
-                    if len(cells) == 2:
-                        key = cells[0].get_text(strip=True)
-                        value = cells[1].get_text(strip=True)
-                        details[key] = value
+            if not details and self.browser_pool:
+                details = await loop.run_in_executor(self.browser_executor, self.fetch_with_browser,
+                                                     url, _DETAILS_TABLE_LOCATOR, _DETAILS_TABLE_JS, self.parse_supplier_details)
             
-            detailed_logger.debug(f"Получены детали поставщика {supplier_id}: {len(details)} полей")
+            detailed_logger.debug("Получены детали поставщика %s: %d полей", supplier_id, len(details))
             return details
             
         except Exception as e:
             detailed_logger.error(f"Ошибка получения деталей {supplier_id}: {e}")
             with self.stats_lock:
                 self.failed_suppliers.add(supplier_id)
-            self.log_failed_attempt(None, supplier_id, str(e))
+            await asyncio.get_running_loop().run_in_executor(self.db_executor, self.log_failed_attempt, None, supplier_id, str(e))
             return {}
     
     def log_failed_attempt(self, page: int = None, supplier_id: str = None, error: str = ""):
         """Логирование неудачных попыток"""
-        conn = sqlite3.connect(self.db_file)
-        cursor = conn.cursor()
-        
         try:
-            cursor.execute('''
-                INSERT INTO failed_attempts (page_number, supplier_id, error_message)
-                VALUES (?, ?, ?)
-            ''', (page, supplier_id, error))
-            conn.commit()
+            self._conn().execute(_SQL_LOG_FAIL, (page, supplier_id, error))
             detailed_logger.warning(f"Неудачная попытка зафиксирована: page={page}, supplier={supplier_id}")
         except Exception as e:
             detailed_logger.error(f"Ошибка логирования неудачной попытки: {e}")
-        finally:
-            conn.close()
     
-    def save_supplier(self, supplier: dict, details: dict = None):
-        """Сохранение поставщика в БД"""
-        conn = sqlite3.connect(self.db_file)
-        cursor = conn.cursor()
+    def unparsed_suppliers(self, suppliers: List[Dict]) -> List[Dict]:
+        """Поставщики, детали которых еще не сохранены в БД и не загружаются; отобранные помечаются занятыми"""
+        supplier_ids = [supplier['supplier_id'] for supplier in suppliers]
+        parsed = set()
+        databases = ('main', 'known') if self.known_db else ('main',)
+        
+        # Не больше 500 параметров в одном IN
+        for i in range(0, len(supplier_ids), 500):
+            chunk = supplier_ids[i:i + 500]
+            placeholders = ','.join('?' * len(chunk))
+            rows = self._conn().execute(
+                " UNION ".join(
+                    f"SELECT supplier_id FROM {db}.suppliers WHERE is_parsed = 1 AND supplier_id IN ({placeholders})"
+                    for db in databases
+                ),
+                chunk * len(databases)
+            )
+            parsed.update(row[0] for row in rows)
         
-        try:
-            cursor.execute('''
-                INSERT OR REPLACE INTO suppliers 
-                (participant_number, name, bin, iin, rnn, supplier_id, detail_url, is_parsed, updated_at)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
+        with self._pending_lock:
+            pending = [
+                supplier for supplier in suppliers
+                if supplier['supplier_id'] not in parsed and supplier['supplier_id'] not in self._claimed_ids
+            ]
+            self._claimed_ids.update(supplier['supplier_id'] for supplier in pending)
+        
+        return pending
+    
+    def save_supplier(self, supplier: dict, details: dict = None) -> int:
+        """Сохранение поставщика в БД"""
+        result = self.save_suppliers_bulk([(supplier, details)])
+        return result[0] if result else 0
+    
+    def save_suppliers_bulk(self, rows: List[tuple]) -> Optional[Tuple[int, int]]:
+        """Сохранение пачки (поставщик, детали) одной транзакцией, возвращает (новых, с деталями) или None при ошибке"""
+        if not rows:
+            return 0, 0
+        
+        updated_at = datetime.now()
+        supplier_rows = [
+            (
                 supplier.get('participant_number', ''),
                 supplier.get('name', ''),
                 supplier.get('bin', ''),
@@ -567,69 +1048,144 @@ class TurboParallelParser:
                 supplier.get('supplier_id', ''),
                 supplier.get('detail_url', ''),
                 details is not None,
-                datetime.now().isoformat()
-            ))
-            
+                updated_at
+            )
+            for supplier, details in rows
+        ]
+        
+        # Детали: старые удаляем, новые вставляем одним executemany
+        detailed_ids = []
+        detail_rows = []
+        for supplier, details in rows:
             if details and supplier.get('supplier_id'):
                 supplier_id = supplier['supplier_id']
-                cursor.execute('DELETE FROM supplier_details WHERE supplier_id = ?', (supplier_id,))
-                
-                for field_name, field_value in details.items():
-                    cursor.execute('''
-                        INSERT INTO supplier_details (supplier_id, section, field_name, field_value)
-                        VALUES (?, ?, ?, ?)
-                    ''', (supplier_id, 'basic', field_name, str(field_value)))
-                
-                detailed_logger.debug(f"Поставщик {supplier_id} сохранен с деталями ({len(details)} полей)")
-            else:
-                detailed_logger.debug(f"Поставщик {supplier.get('supplier_id')} сохранен без деталей")
+                detailed_ids.append(supplier_id)
+                detail_rows.extend(
+                    (supplier_id, 'basic', field_name, str(field_value))
+                    for field_name, field_value in details.items()
+                )
+        
+        conn = self._conn()
+        cursor = conn.cursor()
+        
+        try:
+            cursor.execute("BEGIN")
+            cursor.executemany(_SQL_INSERT_SUPPLIER, supplier_rows)
+            inserted = cursor.rowcount
+            detailed = 0
             
-            conn.commit()
+            if detail_rows:
+                cursor.executemany(_SQL_MARK_PARSED, [(updated_at, supplier_id) for supplier_id in detailed_ids])
+                detailed = cursor.rowcount
+                cursor.executemany(_SQL_DELETE_DETAILS, [(supplier_id,) for supplier_id in detailed_ids])
+                cursor.executemany(_SQL_INSERT_DETAIL, detail_rows)
+            
+            cursor.execute("COMMIT")
+            detailed_logger.debug(f"Сохранено поставщиков одной транзакцией: {len(rows)}, новых: {inserted}, с деталями: {detailed}")
+            return inserted, detailed
             
         except Exception as e:
-            detailed_logger.error(f"Ошибка сохранения поставщика: {e}")
-        finally:
-            conn.close()
+            if conn.in_transaction:
+                cursor.execute("ROLLBACK")
+            detailed_logger.error(f"Ошибка сохранения поставщиков: {e}")
+            return None
     
-    def parallel_round(self, pages: List[int]) -> int:
-        """Параллельный раунд обработки страниц"""
-        round_start = datetime.now()
-        all_suppliers = []
-        
-        # Создаем задачи для параллельного выполнения
-        with ThreadPoolExecutor(max_workers=len(self.browser_pool)) as executor:
-            # Создаем задачи - каждый браузер получает свою страницу
-            future_to_page = {}
-            
-            for i, page in enumerate(pages[:len(self.browser_pool)]):
-                browser = self.browser_pool[i]
-                future = executor.submit(self.process_single_page, browser, page)
-                future_to_page[future] = page
+    async def process_page(self, page: int) -> int:
+        """Полная обработка страницы: реестр и детали новых поставщиков, строки уходят в буфер записи"""
+        suppliers, dup_count = await self.process_single_page(page)
+        loop = asyncio.get_running_loop()
+        
+        # Карточки догружаем тем же клиентом только для еще не разобранных поставщиков
+        details_by_id = {}
+        if self.fetch_details and suppliers:
+            pending = await loop.run_in_executor(self.db_executor, self.unparsed_suppliers, suppliers)
+            details_list = await asyncio.gather(*(self.get_supplier_details(s['supplier_id']) for s in pending))
+            details_by_id = {
+                supplier['supplier_id']: details
+                for supplier, details in zip(pending, details_list) if details
+            }
             
-            # Собираем результаты
-            for future in as_completed(future_to_page):
-                page = future_to_page[future]
-                try:
-                    suppliers = future.result()
-                    all_suppliers.extend(suppliers)
-                    
-                    # Сохраняем найденных поставщиков
-                    for supplier in suppliers:
-                        self.save_supplier(supplier)
-                    
-                    with self.stats_lock:
-                        self.processed_pages += 1
-                        self.found_suppliers += len(suppliers)
-                    
-                    detailed_logger.info(f"Страница {page} обработана: {len(suppliers)} поставщиков")
-                    
-                except Exception as e:
-                    detailed_logger.error(f"Ошибка обработки страницы {page}: {e}")
+            # Неудачные карточки освобождаем сразу, их можно догрузить с другой страницы
+            with self._pending_lock:
+                self._claimed_ids.difference_update(
+                    supplier['supplier_id'] for supplier in pending if supplier['supplier_id'] not in details_by_id
+                )
+        
+        with self._pending_lock:
+            self._pending_rows.extend(
+                (supplier, details_by_id.get(supplier['supplier_id'])) for supplier in suppliers
+            )
+            self._pending_pages += 1
+            flush = self._pending_pages >= SAVE_EVERY_PAGES
+        
+        with self.stats_lock:
+            self.processed_pages += 1
+            self.duplicates_found += dup_count
+        
+        if flush:
+            await loop.run_in_executor(self.db_executor, self.flush_pending_rows)
+        
+        detailed_logger.info("Страница %d обработана: %d поставщиков, %d с деталями", page, len(suppliers), len(details_by_id))
+        return len(suppliers)
+    
+    def flush_pending_rows(self) -> int:
+        """Запись накопленных строк одной транзакцией, возвращает число новых поставщиков"""
+        with self._pending_lock:
+            rows, self._pending_rows = self._pending_rows, []
+            self._pending_pages = 0
+        
+        # Уже известные поставщики отсекаются ограничением UNIQUE
+        result = self.save_suppliers_bulk(rows)
+        
+        # Пачка не записалась - строки возвращаются в начало буфера до следующей записи
+        if result is None:
+            with self._pending_lock:
+                self._pending_rows[:0] = rows
+            detailed_logger.error(f"Пачка из {len(rows)} строк не записана, оставлена в буфере")
+            return 0
+        
+        new_suppliers, detailed_count = result
+        
+        # Записанные карточки теперь видны в БД, отметки о загрузке больше не нужны
+        with self._pending_lock:
+            self._claimed_ids.difference_update(supplier['supplier_id'] for supplier, details in rows if details)
+        
+        with self.stats_lock:
+            self.found_suppliers += new_suppliers
+            self.detailed_suppliers += detailed_count
+            self.duplicates_found += len(rows) - new_suppliers
+        
+        return new_suppliers
+    
+    def pacing_delay(self) -> float:
+        """Пауза перед следующей страницей по доле ошибок в последних запросах"""
+        if len(self.recent_errors) < PACING_MIN_SAMPLES:
+            return 0
         
-        round_time = datetime.now() - round_start
-        detailed_logger.info(f"Раунд завершен за {round_time.total_seconds():.1f}с: {len(all_suppliers)} поставщиков с {len(pages[:len(self.browser_pool)])} страниц")
+        err_rate = sum(self.recent_errors) / len(self.recent_errors)
+        if err_rate < 0.01:
+            return 0
         
-        return len(all_suppliers)
+        return min(PACING_MAX_DELAY, PACING_BASE_DELAY * 2 ** min(5, int(err_rate * 20)))
+    
+    async def page_worker(self, page_queue: asyncio.Queue):
+        """Воркер: без остановок забирает страницы из общей очереди"""
+        while not self.is_shutting_down:
+            try:
+                page = page_queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            
+            # Здоровый сервер - без пауз, при сбоях пауза растет экспоненциально
+            delay = self.pacing_delay()
+            if delay:
+                detailed_logger.debug("Пауза %.0f с перед страницей %d", delay, page)
+                await asyncio.sleep(delay)
+            
+            try:
+                await self.process_page(page)
+            except Exception as e:
+                detailed_logger.error(f"Ошибка обработки страницы {page}: {e}")
     
     def print_turbo_stats(self):
         """Вывод турбо статистики"""
@@ -637,90 +1193,74 @@ class TurboParallelParser:
             runtime = datetime.now() - self.start_time
             pages_percent = (self.processed_pages / self.total_pages) * 100
             
-            # Очищаем консоль и выводим только статистику
-            self.clear_console()
-            
             mode_text = "HEADLESS" if self.headless else "С ИНТЕРФЕЙСОМ"
-            print(f"🚀 ТУРБО ПАРАЛЛЕЛЬНЫЙ ПАРСЕР ({mode_text})")
-            print("=" * 70)
-            print(f"⏱️  Время работы: {str(runtime).split('.')[0]}")
-            print(f"🌐 Активных браузеров: {len(self.browser_pool)} ({mode_text})")
-            print(f"📄 Страниц: {self.processed_pages:,}/{self.total_pages:,} ({pages_percent:.1f}%)")
-            print(f"👥 Найдено: {self.found_suppliers:,} поставщиков")
-            print(f"🔍 Детализировано: {self.detailed_suppliers:,}")
-            print(f"🔄 Дубликатов: {self.duplicates_found:,}")
-            print(f"❌ Неудач страниц: {len(self.failed_pages)}")
-            print(f"❌ Неудач деталей: {len(self.failed_suppliers)}")
+            lines = [
+                f"🚀 ТУРБО ПАРАЛЛЕЛЬНЫЙ ПАРСЕР ({mode_text})",
+                "=" * 70,
+                f"⏱️  Время работы: {str(runtime).split('.')[0]}",
+                f"🌐 Параллельных загрузок: {self.total_browsers} | Резервных браузеров: {len(self.browser_pool)} ({mode_text})",
+                f"📄 Страниц: {self.processed_pages:,}/{self.total_pages:,} ({pages_percent:.1f}%)",
+                f"👥 Найдено: {self.found_suppliers:,} поставщиков",
+                f"🔍 Детализировано: {self.detailed_suppliers:,}",
+                f"🔄 Дубликатов: {self.duplicates_found:,}",
+                f"❌ Неудач страниц: {len(self.failed_pages)}",
+                f"❌ Неудач деталей: {len(self.failed_suppliers)}",
+            ]
             
             if runtime.total_seconds() > 0:
                 pages_per_min = self.processed_pages / (runtime.total_seconds() / 60)
                 suppliers_per_min = self.found_suppliers / (runtime.total_seconds() / 60)
-                print(f"⚡ Скорость: {pages_per_min:.1f} стр/мин | {suppliers_per_min:.1f} поставщиков/мин")
+                lines.append(f"⚡ Скорость: {pages_per_min:.1f} стр/мин | {suppliers_per_min:.1f} поставщиков/мин")
             
-            print("=" * 70)
+            lines.append("=" * 70)
             
             # Логируем в файл подробную статистику
-            detailed_logger.info(f"ТУРБО СТАТИСТИКА: browsers={len(self.browser_pool)}, pages={self.processed_pages}, found={self.found_suppliers}, detailed={self.detailed_suppliers}")
+            detailed_logger.info(f"ТУРБО СТАТИСТИКА: workers={self.total_browsers}, browsers={len(self.browser_pool)}, pages={self.processed_pages}, found={self.found_suppliers}, detailed={self.detailed_suppliers}")
+        
+        # Очищаем консоль и выводим статистику одной записью, уже без блокировки
+        self.clear_console()
+        sys.stdout.write("\n".join(lines) + "\n")
+        sys.stdout.flush()
     
     def run_turbo_parsing(self, start_page: int = 1, end_page: int = 10000):
         """Запуск турбо парсинга"""
         
-        self.clear_console()
         mode_text = "HEADLESS" if self.headless else "С ИНТЕРФЕЙСОМ"
-        print(f"🚀 ТУРБО ПАРАЛЛЕЛЬНЫЙ ПАРСЕР ({mode_text})")
-        print("=" * 70)
-        print(f"🎯 Настройки:")
-        print(f"   • Режим: {mode_text}")
-        print(f"   • Общее количество браузеров: {self.total_browsers}")
-        print(f"   • Передышка между раундами: {self.break_time} секунд")
-        print(f"   • Записей на странице: {self.records_per_page}")
-        print(f"   • Диапазон страниц: {start_page}-{end_page}")
-        print("=" * 70)
+        if self.show_stats:
+            self.clear_console()
+            print(f"🚀 ТУРБО ПАРАЛЛЕЛЬНЫЙ ПАРСЕР ({mode_text})")
+            print("=" * 70)
+            print(f"🎯 Настройки:")
+            print(f"   • Режим: {mode_text}")
+            print(f"   • Параллельных загрузок: {self.total_browsers}")
+            print(f"   • Резервные браузеры для JS: {'да' if self.fallback_js else 'нет'}")
+            print(f"   • Записей на странице: {self.records_per_page}")
+            print(f"   • Диапазон страниц: {start_page}-{end_page}")
+            print("=" * 70)
         
         detailed_logger.info("=== НАЧАЛО ТУРБО ПАРСИНГА ===")
         detailed_logger.info(f"Диапазон страниц: {start_page}-{end_page}")
         detailed_logger.info(f"Headless режим: {self.headless}")
         
         try:
-            # Создаем пул браузеров
-            self.init_browser_pool()
-            
-            if not self.browser_pool:
-                print("❌ Не удалось создать браузеры!")
-                return
+            # Резервный пул браузеров нужен только для страниц с JS
+            if self.fallback_js:
+                self.init_browser_pool()
+                
+                if not self.browser_pool:
+                    print("❌ Не удалось создать браузеры!")
+                    return
             
             # Подготовка страниц для обработки
-            all_pages = list(range(start_page, end_page + 1))
+            all_pages = range(start_page, end_page + 1)
             
             # Запускаем статистику в отдельном потоке
-            stats_thread = threading.Thread(target=self.stats_monitor, daemon=True)
-            stats_thread.start()
-            
-            # Обрабатываем страницы раундами
-            current_page_index = 0
-            round_number = 1
+            if self.show_stats:
+                stats_thread = threading.Thread(target=self.stats_monitor, daemon=True)
+                stats_thread.start()
             
-            while current_page_index < len(all_pages) and not self.is_shutting_down:
-                round_start = datetime.now()
-                
-                # Берем следующие N страниц (по количеству браузеров)
-                pages_for_round = all_pages[current_page_index:current_page_index + len(self.browser_pool)]
-                current_page_index += len(pages_for_round)
-                
-                print(f"\n🔥 РАУНД {round_number}: Обработка страниц {pages_for_round[0]}-{pages_for_round[-1]} ({len(pages_for_round)} браузеров)")
-                
-                # ВСЕ БРАУЗЕРЫ РАБОТАЮТ ОДНОВРЕМЕННО!
-                suppliers_count = self.parallel_round(pages_for_round)
-                
-                round_time = datetime.now() - round_start
-                print(f"✅ Раунд {round_number} завершен за {round_time.total_seconds():.1f}с: {suppliers_count} поставщиков")
-                
-                # ПЕРЕДЫШКА между раундами
-                if current_page_index < len(all_pages) and not self.is_shutting_down:
-                    print(f"😴 Передышка {self.break_time} секунд...")
-                    time.sleep(self.break_time)
-                
-                round_number += 1
+            # Воркеры разбирают общую очередь страниц до конца
+            asyncio.run(self.run_workers(all_pages))
         
         except KeyboardInterrupt:
             print("\n⏹️  Остановка по запросу пользователя...")
@@ -734,30 +1274,192 @@ class TurboParallelParser:
             # Принудительная очистка
             self.cleanup_all()
         
-        self.print_turbo_stats()
-        print(f"\n🎉 ТУРБО ПАРСИНГ ЗАВЕРШЕН! ({'Headless' if self.headless else 'С интерфейсом'})")
+        if self.show_stats:
+            self.print_turbo_stats()
+            print(f"\n🎉 ТУРБО ПАРСИНГ ЗАВЕРШЕН! ({'Headless' if self.headless else 'С интерфейсом'})")
         detailed_logger.info("=== ТУРБО ПАРСИНГ ЗАВЕРШЕН ===")
     
+    async def run_workers(self, all_pages: range):
+        """Обработка страниц постоянными воркерами через общий HTTP клиент"""
+        # Пул keep-alive соединений на весь запуск, DNS кэшируется и резолвится асинхронно
+        connector = aiohttp.TCPConnector(
+            limit=self.total_browsers,
+            ttl_dns_cache=600,
+            resolver=_dns_resolver()
+        )
+        timeout = aiohttp.ClientTimeout(total=15)
+        headers = {'User-Agent': USER_AGENTS[0]}
+        
+        # Все страницы ставятся в очередь сразу, быстрые воркеры не ждут медленных
+        page_queue = asyncio.Queue()
+        for page in all_pages:
+            page_queue.put_nowait(page)
+        
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout, headers=headers) as client:
+            self.client = client
+            self.pages_sem = asyncio.Semaphore(self.total_browsers)
+            self.db_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db")
+            
+            print(f"\n🔥 Запуск {self.total_browsers} воркеров на {len(all_pages)} страниц")
+            try:
+                await asyncio.gather(*(self.page_worker(page_queue) for _ in range(self.total_browsers)))
+            finally:
+                # Дожидаемся начатых записей и дописываем хвост буфера, в том числе при остановке
+                self.db_executor.shutdown(wait=True)
+                self.db_executor = None
+                self.flush_pending_rows()
+        
+        self.client = None
+    
     def stats_monitor(self):
-        """Мониторинг статистики каждые 5 секунд"""
-        while True:
+        """Мониторинг статистики каждые 5 секунд, вывод только при изменении счетчиков"""
+        last = None
+        while not self.is_shutting_down:
             time.sleep(5)  # ОБНОВЛЕНИЕ КАЖДЫЕ 5 СЕКУНД
-            self.print_turbo_stats()
+            current = (self.processed_pages, self.found_suppliers, self.detailed_suppliers)
+            if current != last and not self.is_shutting_down:
+                self.print_turbo_stats()
+                last = current
+
+def parse_page_range(start_page: int, end_page: int, browsers: int, db_file: str, **options) -> Tuple[int, int, int]:
+    """Парсинг диапазона страниц в отдельном процессе со своей БД, возвращает (страниц, новых, детализировано)"""
+    parser = TurboParallelParser(total_browsers=browsers, db_file=db_file, show_stats=False, **options)
+    parser.run_turbo_parsing(start_page, end_page)
+    return parser.processed_pages, parser.found_suppliers, parser.detailed_suppliers
+
+def supplier_counts(db_file: str) -> Tuple[int, int]:
+    """Число поставщиков в БД и сколько из них с разобранной карточкой"""
+    conn = sqlite3.connect(db_file)
+    try:
+        create_tables(conn)
+        return conn.execute("SELECT COUNT(*), COALESCE(SUM(is_parsed), 0) FROM suppliers").fetchone()
+    finally:
+        conn.close()
+
+def split_page_range(start_page: int, end_page: int, parts: int) -> List[Tuple[int, int]]:
+    """Деление диапазона страниц на непересекающиеся куски почти равного размера"""
+    total = end_page - start_page + 1
+    parts = max(1, min(parts, total))
+    size, extra = divmod(total, parts)
+    
+    ranges = []
+    first = start_page
+    for i in range(parts):
+        last = first + size - 1 + (1 if i < extra else 0)
+        ranges.append((first, last))
+        first = last + 1
+    
+    return ranges
+
+def run_multiprocess(start_page: int, end_page: int, browsers: int, processes: int,
+                     db_file: str = 'turbo_goszakup.db', **options) -> Tuple[int, int, int]:
+    """Парсинг несколькими процессами по диапазонам страниц, шарды БД объединяются в основную"""
+    # Каждый процесс пишет в свой шард, объединяется не больше DB_SHARDS файлов
+    ranges = split_page_range(start_page, end_page, min(processes, DB_SHARDS))
+    per_process = max(1, browsers // len(ranges))
+    
+    print(f"🚀 {len(ranges)} процессов по {per_process} параллельных загрузок, страницы {start_page}-{end_page}")
+    detailed_logger.info(f"Многопроцессный запуск: {ranges}, загрузок на процесс: {per_process}")
+    
+    # Основная БД должна существовать: дочерние процессы открывают ее только для чтения
+    suppliers_before, parsed_before = supplier_counts(db_file)
+    pages = 0
+    
+    # spawn: дочерние процессы не наследуют потоки записи логов и открытые соединения
+    with ProcessPoolExecutor(max_workers=len(ranges), mp_context=multiprocessing.get_context('spawn')) as executor:
+        futures = {
+            executor.submit(parse_page_range, first, last, per_process, shard_file(db_file, i),
+                            known_db=db_file, **options): (first, last)
+            for i, (first, last) in enumerate(ranges)
+        }
+        
+        for future in as_completed(futures):
+            first, last = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                print(f"💥 Процесс страниц {first}-{last} завершился с ошибкой: {e}")
+                detailed_logger.error(f"Процесс страниц {first}-{last} завершился с ошибкой: {e}")
+                continue
+            
+            pages += result[0]
+            print(f"✅ Страницы {first}-{last}: {result[0]:,} страниц, {result[1]:,} новых поставщиков, {result[2]:,} с деталями")
+    
+    merged = merge_shards(db_file)
+    print(f"🗄️  Объединено шардов: {merged}")
+    
+    # Одни и те же поставщики могут попасть в несколько шардов, итоги считаем по объединенной БД
+    suppliers_after, parsed_after = supplier_counts(db_file)
+    totals = (pages, suppliers_after - suppliers_before, parsed_after - parsed_before)
+    print(f"🎉 Всего: {totals[0]:,} страниц, {totals[1]:,} поставщиков, {totals[2]:,} с деталями")
+    
+    return totals
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """Аргументы командной строки"""
+    ap = argparse.ArgumentParser(description="Турбо параллельный парсер реестра поставщиков goszakup.gov.kz")
+    ap.add_argument('--browsers', type=int, default=20, help="параллельных загрузок (и резервных браузеров)")
+    ap.add_argument('--start', type=int, default=1, help="начальная страница")
+    ap.add_argument('--end', type=int, default=100, help="конечная страница")
+    ap.add_argument('--headless', action=argparse.BooleanOptionalAction, default=True,
+                    help="резервные браузеры без интерфейса")
+    ap.add_argument('--fallback-js', action='store_true', help="резервные браузеры для страниц с JS")
+    ap.add_argument('--processes', type=int, default=1,
+                    help=f"процессов по диапазонам страниц (до {DB_SHARDS}), 0 - по числу ядер и загрузок")
+    ap.add_argument('--no-details', action='store_true', help="не загружать карточки поставщиков")
+    ap.add_argument('--merge-shards', action='store_true', help="только объединить шарды БД в основную")
+    ap.add_argument('--interactive', action='store_true', help="интерактивное меню")
+    
+    args = ap.parse_args(argv)
+    if args.browsers < 1:
+        ap.error("--browsers должно быть не меньше 1")
+    if not 1 <= args.start <= args.end:
+        ap.error("нужно 1 <= --start <= --end")
+    if args.processes < 0:
+        ap.error("--processes не может быть отрицательным")
+    if args.processes == 0:
+        args.processes = max(1, min(os.cpu_count() or 1, args.browsers // 20))
+    
+    return args
 
 def main():
     # Убираем системные предупреждения
     import warnings
     warnings.filterwarnings("ignore")
     
+    # Без аргументов - прежнее интерактивное меню
+    if not sys.argv[1:]:
+        interactive_menu()
+        return
+    
+    args = parse_args()
+    
+    if args.interactive:
+        interactive_menu()
+    elif args.merge_shards:
+        merged = merge_shards('turbo_goszakup.db')
+        print(f"✅ Объединено шардов: {merged}" if merged else "❌ Шарды БД не найдены")
+    elif args.processes > 1:
+        # Каждый процесс пишет в свой шард, после завершения шарды объединяются
+        run_multiprocess(args.start, args.end, args.browsers, args.processes, headless=args.headless,
+                         fallback_js=args.fallback_js, fetch_details=not args.no_details)
+    else:
+        parser = TurboParallelParser(total_browsers=args.browsers, headless=args.headless,
+                                     fallback_js=args.fallback_js, fetch_details=not args.no_details)
+        parser.run_turbo_parsing(args.start, args.end)
+
+def interactive_menu():
+    """Интерактивное меню с готовыми режимами"""
     print("🚀 ТУРБО ПАРАЛЛЕЛЬНЫЙ ПАРСЕР")
-    print("1. Демо HEADLESS (20 браузеров, первые 100 страниц)")
-    print("2. Быстрый HEADLESS (50 браузеров, 1000 страниц)")
-    print("3. Полный HEADLESS (100 браузеров, 10,000 страниц)")
-    print("4. Экстрим HEADLESS (200 браузеров, 10,000 страниц)")
-    print("5. С интерфейсом (10 браузеров, демо)")
+    print("1. Демо (20 потоков, первые 100 страниц)")
+    print("2. Быстрый (50 потоков, 1000 страниц)")
+    print("3. Полный (100 потоков, 10,000 страниц)")
+    print("4. Экстрим (200 потоков, 10,000 страниц)")
+    print("5. С резервными браузерами с интерфейсом (10 браузеров, демо)")
     print("6. 🔧 КАСТОМНЫЕ НАСТРОЙКИ (выбираете сами)")
+    print("7. 🗄️  Объединить шарды БД в основную")
     
-    choice = input("Выбор (1-6): ").strip()
+    choice = input("Выбор (1-7): ").strip()
     
     if choice == "1":
         parser = TurboParallelParser(total_browsers=20, headless=True)
@@ -766,26 +1468,29 @@ def main():
         parser = TurboParallelParser(total_browsers=50, headless=True)
         parser.run_turbo_parsing(1, 1000)
     elif choice == "3":
-        confirm = input("⚠️  100 HEADLESS браузеров! Продолжить? (y/N): ")
+        confirm = input("⚠️  100 параллельных загрузок! Продолжить? (y/N): ")
         if confirm.lower() == 'y':
             parser = TurboParallelParser(total_browsers=100, headless=True)
             parser.run_turbo_parsing(1, 10000)
         else:
             print("❌ Отменено")
     elif choice == "4":
-        confirm = input("⚠️  200 HEADLESS браузеров! ЭКСТРИМ! Продолжить? (y/N): ")
+        confirm = input("⚠️  200 параллельных загрузок! ЭКСТРИМ! Продолжить? (y/N): ")
         if confirm.lower() == 'y':
             parser = TurboParallelParser(total_browsers=200, headless=True)
             parser.run_turbo_parsing(1, 10000)
         else:
             print("❌ Отменено")
     elif choice == "5":
-        parser = TurboParallelParser(total_browsers=10, headless=False)
+        parser = TurboParallelParser(total_browsers=10, headless=False, fallback_js=True)
         parser.run_turbo_parsing(1, 50)
     elif choice == "6":
         print("\n🔧 КАСТОМНЫЕ НАСТРОЙКИ")
         print("=" * 50)
         
+        # Резервные браузеры для страниц, которым нужен JS
+        fallback_js = input("Резервные браузеры для страниц с JS? (y/N): ").strip().lower() == 'y'
+        
         # Режим браузера
         print("Режим браузера:")
         print("1. HEADLESS (без интерфейса, быстрее)")
@@ -797,7 +1502,7 @@ def main():
         # Количество браузеров
         while True:
             try:
-                browsers_count = int(input("Количество браузеров (1-500): "))
+                browsers_count = int(input("Количество потоков/браузеров (1-500): "))
                 if 1 <= browsers_count <= 500:
                     break
                 else:
@@ -837,20 +1542,27 @@ def main():
         
         print("\n📋 НАСТРОЙКИ:")
         print(f"   • Режим: {mode_text}")
-        print(f"   • Браузеров: {browsers_count}")
+        print(f"   • Потоков: {browsers_count}")
+        print(f"   • Резервные браузеры для JS: {'да' if fallback_js else 'нет'}")
         print(f"   • Страницы: {start_page}-{end_page} ({total_pages:,} страниц)")
         print(f"   • Примерно поставщиков: ~{estimated_suppliers:,}")
         
-        if browsers_count > 100:
+        if fallback_js and browsers_count > 100:
             print(f"⚠️  ВНИМАНИЕ: {browsers_count} браузеров - это большая нагрузка!")
         
         confirm = input("\n🚀 Начать парсинг? (y/N): ")
         
         if confirm.lower() == 'y':
-            parser = TurboParallelParser(total_browsers=browsers_count, headless=headless)
+            parser = TurboParallelParser(total_browsers=browsers_count, headless=headless, fallback_js=fallback_js)
             parser.run_turbo_parsing(start_page, end_page)
         else:
             print("❌ Отменено")
+    elif choice == "7":
+        merged = merge_shards('turbo_goszakup.db')
+        if merged:
+            print(f"✅ Объединено шардов: {merged}")
+        else:
+            print("❌ Шарды БД не найдены")
     else:
         print("❌ Неверный выбор")
 
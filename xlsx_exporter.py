@@ -4,18 +4,74 @@
 Экспортер данных goszakup в красивый XLSX формат
 """
 
+import itertools
 import pandas as pd
+import pyarrow as pa
+from pyarrow import csv
 import sqlite3
-from openpyxl import Workbook
-from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
-from openpyxl.utils.dataframe import dataframe_to_rows
-from openpyxl.worksheet.table import Table, TableStyleInfo
-import json
+import xlsxwriter
 from datetime import datetime
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Ширины колонок табличных листов
+COLUMN_WIDTHS = [15, 40, 15, 15, 15, 12, 20, 25, 25, 12, 30, 30, 15, 12, 20, 20, 30, 15, 30, 40, 25, 15]
+
+# Сколько первых колонок выравнивается по центру
+CENTERED_COLUMNS = 6
+
+# Строки пишутся в файл сразу, в памяти держится только текущая строка;
+# ссылки пишутся обычным текстом: в Excel лимит ~65 тыс. гиперссылок на лист
+WORKBOOK_OPTIONS = {'constant_memory': True, 'use_zip64': True, 'strings_to_urls': False}
+
+# Настройки соединения для экспорта: кэш страниц ~200 МБ и чтение через mmap.
+# Индексы для ORDER BY уже есть - это автоиндексы ограничений UNIQUE
+# (participant_number и supplier_id, section, field_name), сортировки в памяти нет
+EXPORT_PRAGMAS = (
+    "PRAGMA cache_size=-200000",
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA temp_store=MEMORY",
+)
+
+# Размер пачек при потоковом чтении из БД
+MAIN_CHUNK_SIZE = 10_000
+DETAILS_CHUNK_SIZE = 50_000
+
+# Колонки демо экспорта: ключ в CSV -> заголовок в XLSX
+DEMO_COLUMNS = {
+    # Основные колонки
+    'participant_number': 'Номер участника',
+    'name': 'Наименование',
+    'bin': 'БИН',
+    'iin': 'ИИН',
+    'rnn': 'РНН',
+    'supplier_id': 'ID поставщика',
+    
+    # Основная информация
+    'detail_Дата регистрации': 'Дата регистрации',
+    'detail_Дата последнего обновления': 'Дата обновления',
+    'detail_Роли участника': 'Роли участника',
+    'detail_Состоит в реестре государственных заказчиков': 'В реестре гос. заказчиков',
+    'detail_Наименование на рус. языке': 'Наименование (рус)',
+    'detail_Наименование на каз. языке': 'Наименование (каз)',
+    'detail_Резиденство': 'Резиденство',
+    'detail_КАТО': 'КАТО',
+    'detail_Регион': 'Регион',
+    
+    # Контактная информация
+    'detail_E-Mail:': 'Email',
+    'detail_Контактный телефон:': 'Телефон',
+    'detail_Вебсайт:': 'Веб-сайт',
+    
+    # Документы
+    'detail_Серия свидетельства (для ИП) и номер свидетельства о государственной регистрации': 'Серия и номер свидетельства',
+    'detail_Дата свидетельства о государственной регистрации': 'Дата свидетельства',
+    'detail_Наименование администратора(ов) отчетности': 'Администратор отчетности'
+}
+DEMO_COLUMN_KEYS = list(DEMO_COLUMNS)
+DEMO_HEADERS = list(DEMO_COLUMNS.values())
+
 class XLSXExporter:
     def __init__(self, db_file: str = 'turbo_goszakup.db'):
         self.db_file = db_file
@@ -25,95 +81,60 @@ class XLSXExporter:
         logger.info(f"Экспорт демо данных из {csv_file} в {output_file}")
         
         # Читаем CSV
-        df = pd.read_csv(csv_file, encoding='utf-8-sig')
+        df = self._read_csv(csv_file)
         
-        # Создаем workbook
-        wb = Workbook()
+        # Создаем workbook: ячейки пишутся потоком и не держатся в памяти
+        wb = xlsxwriter.Workbook(output_file, WORKBOOK_OPTIONS)
+        self._register_styles(wb)
         
         # Основной лист с данными
-        ws_main = wb.active
-        ws_main.title = "Поставщики"
-        
-        # Определяем структуру колонок
-        main_columns = {
-            'participant_number': 'Номер участника',
-            'name': 'Наименование',
-            'bin': 'БИН',
-            'iin': 'ИИН', 
-            'rnn': 'РНН',
-            'supplier_id': 'ID поставщика'
-        }
-        
-        # Основная информация
-        basic_columns = {
-            'detail_Дата регистрации': 'Дата регистрации',
-            'detail_Дата последнего обновления': 'Дата обновления',
-            'detail_Роли участника': 'Роли участника',
-            'detail_Состоит в реестре государственных заказчиков': 'В реестре гос. заказчиков',
-            'detail_Наименование на рус. языке': 'Наименование (рус)',
-            'detail_Наименование на каз. языке': 'Наименование (каз)',
-            'detail_Резиденство': 'Резиденство',
-            'detail_КАТО': 'КАТО',
-            'detail_Регион': 'Регион'
-        }
+        ws_main = wb.add_worksheet("Поставщики")
         
-        # Контактная информация
-        contact_columns = {
-            'detail_E-Mail:': 'Email',
-            'detail_Контактный телефон:': 'Телефон',
-            'detail_Вебсайт:': 'Веб-сайт'
-        }
-        
-        # Документы
-        doc_columns = {
-            'detail_Серия свидетельства (для ИП) и номер свидетельства о государственной регистрации': 'Серия и номер свидетельства',
-            'detail_Дата свидетельства о государственной регистрации': 'Дата свидетельства',
-            'detail_Наименование администратора(ов) отчетности': 'Администратор отчетности'
-        }
-        
-        # Подготавливаем данные для основного листа
-        main_data = []
-        all_columns = {**main_columns, **basic_columns, **contact_columns, **doc_columns}
-        
-        for _, row in df.iterrows():
-            row_data = []
-            for col_key, col_name in all_columns.items():
-                value = row.get(col_key, '')
-                if pd.isna(value):
-                    value = ''
-                row_data.append(str(value))
-            main_data.append(row_data)
-        
-        # Заголовки
-        headers = list(all_columns.values())
+        # Подготавливаем данные для основного листа одной операцией по колонкам,
+        # отсутствующие в CSV колонки и пропуски превращаются в пустые строки;
+        # строки отдаются кортежами по мере записи, без промежуточного списка
+        main_data = df.reindex(columns=DEMO_COLUMN_KEYS).fillna('').astype(str).itertuples(index=False, name=None)
         
-        # Записываем данные
-        ws_main.append(headers)
-        for row_data in main_data:
-            ws_main.append(row_data)
-        
-        # Форматирование основного листа
-        self._format_main_sheet(ws_main, len(headers))
+        # Записываем заголовки и данные
+        self._write_table(ws_main, DEMO_HEADERS, main_data)
         
         # Создаем лист со статистикой
-        ws_stats = wb.create_sheet("Статистика")
+        ws_stats = wb.add_worksheet("Статистика")
         self._create_stats_sheet(ws_stats, df)
         
         # Создаем лист с регионами
-        ws_regions = wb.create_sheet("По регионам")
+        ws_regions = wb.add_worksheet("По регионам")
         self._create_regions_sheet(ws_regions, df)
         
         # Сохраняем файл
-        wb.save(output_file)
+        wb.close()
         logger.info(f"XLSX файл сохранен: {output_file}")
         
         return output_file
         
+    def _read_csv(self, csv_file: str) -> pd.DataFrame:
+        """Многопоточное чтение CSV через pyarrow, даты остаются строками как в pandas"""
+        # pyarrow сам распознает ISO даты и время, pandas оставлял их текстом - по первому блоку
+        # находим такие колонки и читаем их строками (BOM pyarrow пропускает сам)
+        with csv.open_csv(csv_file) as reader:
+            schema = reader.schema
+        column_types = {
+            field.name: pa.string()
+            for field in schema if pa.types.is_timestamp(field.type) or pa.types.is_date(field.type)
+        }
+        
+        # Пустые значения в текстовых колонках - пропуски, как в pandas
+        convert_options = csv.ConvertOptions(column_types=column_types, strings_can_be_null=True)
+        table = csv.read_csv(csv_file, convert_options=convert_options)
+        return table.to_pandas(split_blocks=True, self_destruct=True)
+        
     def export_from_db_to_xlsx(self, output_file: str = 'goszakup_full_database.xlsx'):
         """Экспорт из базы данных в XLSX"""
         logger.info(f"Экспорт из базы данных в {output_file}")
         
         conn = sqlite3.connect(self.db_file)
+        for pragma in EXPORT_PRAGMAS:
+            conn.execute(pragma)
         
         # Получаем основные данные
         main_query = '''
@@ -132,8 +153,6 @@ class XLSXExporter:
             ORDER BY participant_number
         '''
         
-        df_main = pd.read_sql_query(main_query, conn)
-        
         # Получаем детальные данные
         details_query = '''
             SELECT 
@@ -145,188 +164,205 @@ class XLSXExporter:
             ORDER BY supplier_id, section, field_name
         '''
         
-        df_details = pd.read_sql_query(details_query, conn)
-        conn.close()
-        
-        # Создаем workbook
-        wb = Workbook()
-        
-        # Основной лист
-        ws_main = wb.active
-        ws_main.title = "Поставщики"
+        # Создаем workbook: ячейки пишутся потоком и не держатся в памяти
+        wb = xlsxwriter.Workbook(output_file, WORKBOOK_OPTIONS)
+        self._register_styles(wb)
         
-        # Записываем основные данные
-        for r in dataframe_to_rows(df_main, index=False, header=True):
-            ws_main.append(r)
-            
-        self._format_main_sheet(ws_main, len(df_main.columns))
+        # Основной лист: данные читаются из БД пачками прямо в лист
+        ws_main = wb.add_worksheet("Поставщики")
+        self._write_query(ws_main, conn, main_query, MAIN_CHUNK_SIZE)
         
         # Лист с детальными данными
-        if not df_details.empty:
-            ws_details = wb.create_sheet("Детальная информация")
-            for r in dataframe_to_rows(df_details, index=False, header=True):
-                ws_details.append(r)
-            self._format_details_sheet(ws_details, len(df_details.columns))
+        has_details = conn.execute("SELECT EXISTS(SELECT 1 FROM supplier_details)").fetchone()[0]
+        if has_details:
+            ws_details = wb.add_worksheet("Детальная информация")
+            self._write_query(ws_details, conn, details_query, DETAILS_CHUNK_SIZE)
         
         # Статистика
-        ws_stats = wb.create_sheet("Статистика БД")
-        self._create_db_stats_sheet(ws_stats, df_main, df_details)
+        ws_stats = wb.add_worksheet("Статистика БД")
+        self._create_db_stats_sheet(ws_stats, conn)
+        conn.close()
         
-        wb.save(output_file)
+        wb.close()
         logger.info(f"XLSX файл из БД сохранен: {output_file}")
         
         return output_file
         
-    def _format_main_sheet(self, ws, num_columns):
-        """Форматирование основного листа"""
-        
-        # Стили
-        header_font = Font(name='Arial', size=12, bold=True, color='FFFFFF')
-        header_fill = PatternFill(start_color='366092', end_color='366092', fill_type='solid')
+    def _register_styles(self, wb):
+        """Создание общих форматов книги, ячейки ссылаются на них при записи"""
+        border = {'border': 1}
+        data = {'font_name': 'Arial', 'font_size': 10, 'valign': 'vcenter', **border}
         
-        data_font = Font(name='Arial', size=10)
-        alternate_fill = PatternFill(start_color='F2F2F2', end_color='F2F2F2', fill_type='solid')
+        self._styles = {
+            'hdr': wb.add_format({
+                'font_name': 'Arial', 'font_size': 12, 'bold': True, 'font_color': '#FFFFFF',
+                'bg_color': '#366092', 'align': 'center', 'valign': 'vcenter', **border
+            }),
+            
+            # Данные: основные колонки по центру, остальные слева с переносом
+            'data_center': wb.add_format({**data, 'align': 'center'}),
+            'data_left': wb.add_format({**data, 'align': 'left', 'text_wrap': True}),
+            
+            # Заливка четных строк для условного форматирования
+            'alternate': wb.add_format({'bg_color': '#F2F2F2'}),
+            
+            # Листы статистики
+            'stats_title': wb.add_format({'font_size': 16, 'bold': True}),
+            'stats_section': wb.add_format({'font_size': 12, 'bold': True, 'font_color': '#366092'}),
+            'stats_text': wb.add_format({'font_size': 10}),
+        }
+    
+    def _write_table(self, ws, headers, rows):
+        """Потоковая запись таблицы: заголовок и строки с общими форматами"""
+        headers = list(headers)
+        num_columns = len(headers)
         
-        alignment_center = Alignment(horizontal='center', vertical='center')
-        alignment_left = Alignment(horizontal='left', vertical='center', wrap_text=True)
+        # Ширины и закрепление задаются до строк, строки пишутся строго по порядку
+        self._format_main_sheet(ws, num_columns)
         
-        border = Border(
-            left=Side(border_style='thin'),
-            right=Side(border_style='thin'),
-            top=Side(border_style='thin'),
-            bottom=Side(border_style='thin')
+        ws.write_row(0, 0, headers, self._styles['hdr'])
+        
+        # Основные колонки по центру, остальные слева: по одному вызову на группу
+        center = self._styles['data_center']
+        left = self._styles['data_left']
+        
+        row_count = 0
+        for row_count, row in enumerate(rows, 1):
+            ws.write_row(row_count, 0, row[:CENTERED_COLUMNS], center)
+            if num_columns > CENTERED_COLUMNS:
+                ws.write_row(row_count, CENTERED_COLUMNS, row[CENTERED_COLUMNS:], left)
+        
+        # Чередующиеся цвета строк одним правилом Excel вместо заливки каждой ячейки
+        if row_count:
+            ws.conditional_format(1, 0, row_count, num_columns - 1, {
+                'type': 'formula',
+                'criteria': '=MOD(ROW(),2)=0',
+                'format': self._styles['alternate']
+            })
+    
+    def _write_query(self, ws, conn, query, chunksize):
+        """Потоковая запись результата запроса: в памяти только одна пачка строк"""
+        chunks = pd.read_sql_query(query, conn, chunksize=chunksize)
+        first = next(chunks)
+        
+        # NULL из числовых колонок приходит как NaN, в ячейку он пишется пустым
+        rows = (
+            row
+            for chunk in itertools.chain([first], chunks)
+            for row in chunk.astype(object).where(chunk.notna(), None).itertuples(index=False, name=None)
         )
+        self._write_table(ws, first.columns, rows)
+    
+    def _format_main_sheet(self, ws, num_columns):
+        """Ширина колонок, закрепление заголовка и автофильтр"""
         
-        # Форматируем заголовки
-        for col in range(1, num_columns + 1):
-            cell = ws.cell(row=1, column=col)
-            cell.font = header_font
-            cell.fill = header_fill
-            cell.alignment = alignment_center
-            cell.border = border
-            
-        # Форматируем данные и устанавливаем ширину колонок
-        column_widths = [15, 40, 15, 15, 15, 12, 20, 25, 25, 12, 30, 30, 15, 12, 20, 20, 30, 15, 30, 40, 25, 15]
-        
-        for row in range(2, ws.max_row + 1):
-            for col in range(1, num_columns + 1):
-                cell = ws.cell(row=row, column=col)
-                cell.font = data_font
-                cell.border = border
-                
-                if col <= 6:  # Основные колонки - по центру
-                    cell.alignment = alignment_center
-                else:  # Остальные - по левому краю с переносом
-                    cell.alignment = alignment_left
-                
-                # Чередующиеся цвета строк
-                if row % 2 == 0:
-                    cell.fill = alternate_fill
-                    
         # Устанавливаем ширину колонок
-        for i, width in enumerate(column_widths[:num_columns], 1):
-            ws.column_dimensions[ws.cell(row=1, column=i).column_letter].width = width
+        for i, width in enumerate(COLUMN_WIDTHS[:num_columns]):
+            ws.set_column(i, i, width)
             
         # Замораживаем первую строку
-        ws.freeze_panes = 'A2'
+        ws.freeze_panes(1, 0)
         
         # Добавляем автофильтр
-        ws.auto_filter.ref = f"A1:{ws.cell(row=1, column=num_columns).coordinate}"
-        
-    def _format_details_sheet(self, ws, num_columns):
-        """Форматирование листа с деталями"""
-        self._format_main_sheet(ws, num_columns)
+        ws.autofilter(0, 0, 0, num_columns - 1)
+    
+    def _write_stats_rows(self, ws, rows, text_style=None):
+        """Запись строк статистики: заголовок отчета, разделы и значения"""
+        # Форматы берутся из кэша книги один раз, а не на каждую ячейку
+        title_format = self._styles['stats_title']
+        section_format = self._styles['stats_section']
+        text_format = self._styles[text_style] if text_style else None
+        
+        if rows:
+            ws.write_row(0, 0, rows[0], title_format)
+        
+        for row_index, row in enumerate(rows[1:], 1):
+            for col_index, value in enumerate(row):
+                text = str(value)
+                cell_format = section_format if text.isupper() and len(text) > 10 else text_format
+                ws.write(row_index, col_index, value, cell_format)
         
     def _create_stats_sheet(self, ws, df):
         """Создание листа со статистикой"""
-        ws.append(['СТАТИСТИКА ПАРСИНГА GOSZAKUP.GOV.KZ'])
-        ws.append([])
-        ws.append(['Дата создания отчета:', datetime.now().strftime('%d.%m.%Y %H:%M:%S')])
-        ws.append([])
-        
-        # Общая статистика
-        ws.append(['ОБЩАЯ ИНФОРМАЦИЯ'])
-        ws.append(['Всего записей:', len(df)])
-        ws.append(['Записей с БИН:', len(df[df['bin'].notna() & (df['bin'] != '')])])
-        ws.append(['Записей с ИИН:', len(df[df['iin'].notna() & (df['iin'] != '')])])
-        ws.append(['Записей с РНН:', len(df[df['rnn'].notna() & (df['rnn'] != '')])])
-        ws.append([])
+        ws.set_column(0, 0, 30)
+        ws.set_column(1, 1, 15)
+        
+        rows = [
+            ['СТАТИСТИКА ПАРСИНГА GOSZAKUP.GOV.KZ'],
+            [],
+            ['Дата создания отчета:', datetime.now().strftime('%d.%m.%Y %H:%M:%S')],
+            [],
+            # Общая статистика
+            ['ОБЩАЯ ИНФОРМАЦИЯ'],
+            ['Всего записей:', len(df)],
+            ['Записей с БИН:', len(df[df['bin'].notna() & (df['bin'] != '')])],
+            ['Записей с ИИН:', len(df[df['iin'].notna() & (df['iin'] != '')])],
+            ['Записей с РНН:', len(df[df['rnn'].notna() & (df['rnn'] != '')])],
+            [],
+        ]
         
         # Статистика по регионам
         if 'detail_Регион' in df.columns:
-            ws.append(['СТАТИСТИКА ПО РЕГИОНАМ'])
+            rows.append(['СТАТИСТИКА ПО РЕГИОНАМ'])
             region_stats = df['detail_Регион'].value_counts().head(10)
-            for region, count in region_stats.items():
-                ws.append([region, count])
-        
-        # Форматирование
-        for row in range(1, ws.max_row + 1):
-            for col in range(1, 3):
-                cell = ws.cell(row=row, column=col)
-                if row == 1:
-                    cell.font = Font(size=16, bold=True)
-                elif str(cell.value).isupper() and len(str(cell.value)) > 10:
-                    cell.font = Font(size=12, bold=True, color='366092')
-                else:
-                    cell.font = Font(size=10)
-                    
-        ws.column_dimensions['A'].width = 30
-        ws.column_dimensions['B'].width = 15
+            rows.extend([region, count] for region, count in region_stats.items())
+        
+        self._write_stats_rows(ws, rows, 'stats_text')
         
     def _create_regions_sheet(self, ws, df):
         """Создание листа с группировкой по регионам"""
         if 'detail_Регион' not in df.columns:
-            ws.append(['Данные по регионам недоступны'])
+            ws.write(0, 0, 'Данные по регионам недоступны')
             return
             
-        region_data = df.groupby('detail_Регион').agg({
-            'participant_number': 'count',
-            'bin': lambda x: x.notna().sum(),
-            'iin': lambda x: x.notna().sum(),
-            'detail_E-Mail:': lambda x: x.notna().sum()
-        }).reset_index()
-        
-        region_data.columns = ['Регион', 'Всего поставщиков', 'С БИН', 'С ИИН', 'С Email']
+        # Флаги заполненности считаются заранее, группировка идет только встроенными агрегатами
+        region_data = df.assign(
+            has_bin=df['bin'].notna(),
+            has_iin=df['iin'].notna(),
+            has_email=df['detail_E-Mail:'].notna()
+        ).groupby('detail_Регион').agg(**{
+            'Всего поставщиков': ('participant_number', 'count'),
+            'С БИН': ('has_bin', 'sum'),
+            'С ИИН': ('has_iin', 'sum'),
+            'С Email': ('has_email', 'sum')
+        }).rename_axis('Регион').reset_index()
         
         # Записываем данные
-        for r in dataframe_to_rows(region_data, index=False, header=True):
-            ws.append(r)
-            
-        self._format_main_sheet(ws, len(region_data.columns))
+        self._write_table(ws, region_data.columns, region_data.itertuples(index=False, name=None))
         
-    def _create_db_stats_sheet(self, ws, df_main, df_details):
+    def _create_db_stats_sheet(self, ws, conn):
         """Создание листа со статистикой БД"""
-        ws.append(['СТАТИСТИКА БАЗЫ ДАННЫХ GOSZAKUP'])
-        ws.append([])
-        ws.append(['Дата создания отчета:', datetime.now().strftime('%d.%m.%Y %H:%M:%S')])
-        ws.append([])
-        
-        # Статистика основной таблицы
-        ws.append(['ОСНОВНАЯ ТАБЛИЦА ПОСТАВЩИКОВ'])
-        ws.append(['Всего записей:', len(df_main)])
-        ws.append(['Обработано детально:', len(df_main[df_main['Данные получены'] == 1])])
-        ws.append(['Ожидают обработки:', len(df_main[df_main['Данные получены'] == 0])])
-        ws.append([])
+        ws.set_column(0, 0, 35)
+        ws.set_column(1, 1, 15)
+        
+        # Счетчики считает сама БД, таблицы целиком в память не читаются
+        total, parsed, pending = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(is_parsed = 1), 0), COALESCE(SUM(is_parsed = 0), 0) FROM suppliers"
+        ).fetchone()
+        section_stats = conn.execute(
+            "SELECT section, COUNT(*) FROM supplier_details GROUP BY section ORDER BY COUNT(*) DESC"
+        ).fetchall()
+        
+        rows = [
+            ['СТАТИСТИКА БАЗЫ ДАННЫХ GOSZAKUP'],
+            [],
+            ['Дата создания отчета:', datetime.now().strftime('%d.%m.%Y %H:%M:%S')],
+            [],
+            # Статистика основной таблицы
+            ['ОСНОВНАЯ ТАБЛИЦА ПОСТАВЩИКОВ'],
+            ['Всего записей:', total],
+            ['Обработано детально:', parsed],
+            ['Ожидают обработки:', pending],
+            [],
+        ]
         
         # Статистика деталей
-        if not df_details.empty:
-            ws.append(['ДЕТАЛЬНАЯ ИНФОРМАЦИЯ'])
-            ws.append(['Всего детальных записей:', len(df_details)])
-            section_stats = df_details['Секция'].value_counts()
-            for section, count in section_stats.items():
-                ws.append([f'Секция "{section}":', count])
-        
-        # Форматирование
-        for row in range(1, ws.max_row + 1):
-            for col in range(1, 3):
-                cell = ws.cell(row=row, column=col)
-                if row == 1:
-                    cell.font = Font(size=16, bold=True)
-                elif str(cell.value).isupper() and len(str(cell.value)) > 10:
-                    cell.font = Font(size=12, bold=True, color='366092')
-                    
-        ws.column_dimensions['A'].width = 35
-        ws.column_dimensions['B'].width = 15
+        if section_stats:
+            rows.append(['ДЕТАЛЬНАЯ ИНФОРМАЦИЯ'])
+            rows.append(['Всего детальных записей:', sum(count for _, count in section_stats)])
+            rows.extend([f'Секция "{section}":', count] for section, count in section_stats)
+        
+        self._write_stats_rows(ws, rows)
 
 def main():
     """Главная функция экспорта"""